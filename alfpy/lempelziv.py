@@ -137,20 +137,31 @@ class Distance:
     Otu and Sayood (2003), based on LZ complexity.
     """
 
-    def __init__(self, seq_records, disttype='d1_star'):
+    def __init__(self, seq_records, disttype='d1_star', precompute=True):
+        """
+        Args:
+            seq_records (obj): instance of SeqRecords
+            disttype (str): distance method name
+            precompute (bool): compute complexities of all pairwise
+                concatenated sequences up front. If False, they are
+                computed on demand, which is faster when distances are
+                needed only for some pairs (e.g. queries vs references).
+        """
         self.seq_records = seq_records
         # Precomputed L-Z complexity for input sequences
         # as well as all pairwise concatenated sequences.
-        self._complexity = self.__precompute_complexity()
+        self._complexity = self.__precompute_complexity(precompute)
         # Set a default distance measure.
         self.set_disttype(disttype)
 
-    def __precompute_complexity(self):
+    def __precompute_complexity(self, pairs=True):
         d = {}
         # Complexity for single input sequences.
         seqs = self.seq_records.seq_list
         for seqidx, seq in enumerate(seqs):
             d[(seqidx,)] = complexity(seq)
+        if not pairs:
+            return d
         # Complexity for pairwise concatenated sequences.
         for i, j in itertools.combinations(range(self.seq_records.count), 2):
             seq12 = seqs[i] + seqs[j]
@@ -165,6 +176,12 @@ class Distance:
         # Fetch cached complexity values.
         c1 = self._complexity[(seq1idx,)]
         c2 = self._complexity[(seq2idx,)]
+        if (seq1idx, seq2idx) not in self._complexity:
+            seqs = self.seq_records.seq_list
+            self._complexity[(seq1idx, seq2idx)] = complexity(
+                seqs[seq1idx] + seqs[seq2idx])
+            self._complexity[(seq2idx, seq1idx)] = complexity(
+                seqs[seq2idx] + seqs[seq1idx])
         c12 = self._complexity[(seq1idx, seq2idx)]
         c21 = self._complexity[(seq2idx, seq1idx)]
         return c1, c2, c12, c21
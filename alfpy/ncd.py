@@ -30,21 +30,30 @@ def complexity(s):
 
 class Distance():
 
-    def __init__(self, seq_records):
-
+    def __init__(self, seq_records, precompute=True):
+        """
+        Args:
+            seq_records (obj): instance of SeqRecords
+            precompute (bool): compress all pairwise concatenated
+                sequences up front. If False, they are compressed on
+                demand, which is faster when distances are needed only
+                for some pairs (e.g. queries vs references).
+        """
         self.seq_records = seq_records
         self._complexity = {}
         self.numseqs = seq_records.count
         # Precomputed complexity for input sequences
         # as well as all pairwise concatenated sequences.
-        self._complexity = self.__precompute_complexity()
+        self._complexity = self.__precompute_complexity(precompute)
 
-    def __precompute_complexity(self):
+    def __precompute_complexity(self, pairs=True):
         d = {}
         seqs = self.seq_records.seq_list
         # Complexity for single input sequences.
         for seqidx, seq in enumerate(seqs):
             d[(seqidx,)] = complexity(seq)
+        if not pairs:
+            return d
         # Complexity for pairwise concatenated sequences.
         for i, j in itertools.combinations(range(self.numseqs), 2):
             seq12 = seqs[i] + seqs[j]
@@ -64,6 +73,10 @@ class Distance():
         """
         zx = self._complexity[(seq1idx,)]
         zy = self._complexity[(seq2idx,)]
+        if (seq1idx, seq2idx) not in self._complexity:
+            seqs = self.seq_records.seq_list
+            self._complexity[(seq1idx, seq2idx)] = complexity(
+                seqs[seq1idx] + seqs[seq2idx])
         zxy = self._complexity[(seq1idx, seq2idx)]
         return (zxy - min([zx, zy])) / max([zx, zy])
 
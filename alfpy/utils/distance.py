@@ -6,6 +6,85 @@ with distance function.
 import math
 import numpy as np
 
+from . import sparse
+
+
+# Maximum number of elements of intermediate arrays created while
+# computing a block of distances (2**22 float64 values = 32 MB).
+BLOCK_BUFFER_SIZE = 2**22
+
+# Squared Euclidean distances computed from a Gram matrix that are
+# smaller than this fraction of the sum of squared norms of the two
+# vectors lose precision to cancellation, and are recomputed directly
+# (see `block_euclid_squared`).
+GRAM_CANCELLATION_TOL = 1e-6
+
+
+def block_reduce(func, x, y):
+    """Sum `func(x_i, y_j)` over vector elements for all pairs of rows.
+
+    Vectors are processed in chunks of columns, so that the broadcast
+    intermediate array never exceeds BLOCK_BUFFER_SIZE elements.
+
+    Sparse vectors (see `sparse.block_reduce`) require `func(0, 0)` == 0.
+
+    Args:
+        func (ufunc): element-wise function of two arrays (e.g. np.minimum)
+        x (ndarray/CSRMatrix): 2-D array of vectors, shape (M, K)
+        y (ndarray/CSRMatrix): 2-D array of vectors, shape (N, K)
+
+    Returns:
+        ndarray of shape (M, N)
+
+    """
+    if isinstance(x, sparse.CSRMatrix):
+        return sparse.block_reduce(func, x, y, BLOCK_BUFFER_SIZE)
+    pairs = max(x.shape[0] * y.shape[0], 1)
+    step = max(BLOCK_BUFFER_SIZE // pairs, 1)
+    value = np.zeros((x.shape[0], y.shape[0]))
+    for start in range(0, x.shape[1], step):
+        xc = x[:, np.newaxis, start:start + step]
+        yc = y[np.newaxis, :, start:start + step]
+        value += np.sum(func(xc, yc), axis=2)
+    return value
+
+
+def block_dot(x, y):
+    """Dot products of all pairs of rows of two 2-D arrays of vectors
+    (ndarrays or CSRMatrix objects)."""
+    if isinstance(x, sparse.CSRMatrix):
+        return sparse.block_reduce(np.multiply, x, y, BLOCK_BUFFER_SIZE)
+    return np.dot(x, y.T)
+
+
+def block_euclid_squared(x, y):
+    """Squared Euclidean distances between all pairs of rows of two
+    2-D arrays of vectors (ndarrays or CSRMatrix objects).
+
+    Distances are computed as ||x||^2 + ||y||^2 - 2 x.y^T, with a single
+    matrix product of the two arrays. Pairs of (nearly) equal vectors,
+    for which the subtraction cancels most significant digits, are
+    recomputed from differences of their vectors, and negative values
+    due to rounding are clamped to 0.
+
+    """
+    xnorms = (x**2).sum(axis=1)
+    ynorms = (y**2).sum(axis=1)
+    norms = np.add.outer(xnorms, ynorms)
+    value = norms - 2 * block_dot(x, y)
+    rows, cols = np.nonzero((value <= GRAM_CANCELLATION_TOL * norms) &
+                            (norms > 0))
+    if isinstance(x, sparse.CSRMatrix):
+        for i, j in zip(rows, cols):
+            value[i, j] = np.sum((x[i] - y[j])**2)
+    else:
+        step = max(BLOCK_BUFFER_SIZE // max(x.shape[1], 1), 1)
+        for start in range(0, len(rows), step):
+            i = rows[start:start + step]
+            j = cols[start:start + step]
+            value[i, j] = np.sum((x[i] - y[j])**2, axis=1)
+    return np.maximum(value, 0.0, out=value)
+
 
 class Distance(object):
     """Combine sequences-representing 2-D array of vectors
@@ -15,6 +94,9 @@ class Distance(object):
         _vector (ndarray)
         _disttype (str): distance method name
         pairwise_distance (func): distance method
+        block_distance (func): vectorized distance method computing
+            a whole block of distances at once, or None if the distance
+            method has no block implementation
 
     """
 
@@ -40,6 +122,20 @@ class Distance(object):
         except AttributeError:
             msg = 'unknown disttype "{}"'.format(disttype)
             raise ValueError(msg)
+        # Block implementation is optional.
+        self.block_distance = getattr(self,
+                                      'blockdist_{}'.format(disttype), None)
+
+    def _block_vectors(self, seqidxs):
+        """Return 2-D array of vectors for given sequence indices
+        (slice or array of indices).
+
+        Sparse vectors are returned as CSRMatrix.
+        """
+        data = getattr(self._vector, 'data', self._vector)
+        if not isinstance(data, sparse.CSRMatrix):
+            data = np.asarray(data)
+        return data[seqidxs].astype(float, copy=False)
 
     def __init__(self, vector, disttype):
         """Create instance of Distance.
@@ -84,6 +180,25 @@ class Distance(object):
         value = math.sqrt(self.pwdist_euclid_squared(seq1idx, seq2idx))
         return value
 
+    def blockdist_euclid_squared(self, seq1idxs, seq2idxs):
+        """Squared Euclidean distances between two sets of sequences.
+
+        Args:
+            seq1idxs (slice/ndarray): indices of sequences (rows)
+            seq2idxs (slice/ndarray): indices of sequences (columns)
+
+        Returns:
+            ndarray of shape (len(seq1idxs), len(seq2idxs))
+
+        """
+        x = self._block_vectors(seq1idxs)
+        y = self._block_vectors(seq2idxs)
+        return block_euclid_squared(x, y)
+
+    def blockdist_euclid_norm(self, seq1idxs, seq2idxs):
+        """Euclidean distances between two sets of sequences."""
+        return np.sqrt(self.blockdist_euclid_squared(seq1idxs, seq2idxs))
+
     def pwdist_google(self, seq1idx, seq2idx):
         """Normalized Google Distance (NGD).
 
@@ -110,3 +225,14 @@ class Distance(object):
         ngd = (max([sumwx, sumwy]) - summin) / \
             ((sumwx + sumwy) - min([sumwx, sumwy]))
         return ngd
+
+    def blockdist_google(self, seq1idxs, seq2idxs):
+        """Normalized Google Distances between two sets of sequences."""
+        x = self._block_vectors(seq1idxs)
+        y = self._block_vectors(seq2idxs)
+        sumwx = np.sum(x, axis=1)[:, np.newaxis]
+        sumwy = np.sum(y, axis=1)[np.newaxis, :]
+        summin = block_reduce(np.minimum, x, y)
+        ngd = (np.maximum(sumwx, sumwy) - summin) / \
+            ((sumwx + sumwy) - np.minimum(sumwx, sumwy))
+        return ngd
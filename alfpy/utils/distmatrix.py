@@ -1,18 +1,424 @@
 """This module creates and handles distance matrices"""
 
-import itertools
+import io
+import json
 import numpy as np
+import struct
 import sys
+import zipfile
 
 
-def create(id_list, distance):
+# Default number of rows/columns of a tile of distance matrix.
+TILE_SIZE = 512
+
+# Maximum number of matrix values processed at once by Matrix methods
+# streaming over the matrix (2**22 float64 values = 32 MB).
+CHUNK_SIZE = 2**22
+
+# First bytes of a file storing a memory-mapped distance matrix.
+MEMMAP_MAGIC = b'ALFPYDM1'
+
+# First bytes of a file storing distances in binary `pairwise` format.
+PAIRWISE_MAGIC = b'ALFPYPW1'
+
+# Record of binary `pairwise` format: indices of sequences and distance.
+PAIRWISE_DTYPE = np.dtype([('i', '<u4'), ('j', '<u4'), ('d', '<f4')])
+
+# Text and binary formats of distance matrix output.
+OUTPUT_FORMATS = ['phylip', 'pairwise', 'npz', 'pairwise_bin']
+BINARY_FORMATS = ['npz', 'pairwise_bin']
+
+# Output formats of nearest neighbours (see `nearest`).
+NEAREST_FORMATS = ['pairwise', 'npz']
+
+# Number of characters collected before a bulk write to an output file.
+WRITE_BUFFER_SIZE = 2**20
+
+
+def _phylip_lines(id_list, rows, decimal_places):
+    """Format rows of a distance matrix as lines of PHYLIP format.
+
+    Each row is formatted with a single %-operation on a precomputed
+    format string, which gives the same result as formatting every value
+    with '{0:.{1}f}'.format, but avoids a Python-level loop over values.
+
+    """
+    fmt = None
+    for seqid, line in zip(id_list, rows):
+        if fmt is None:
+            fmt = " ".join(['%.{0}f'.format(decimal_places)] * len(line))
+        # PHYLIP requires that each sequence identifier
+        # is maximum 10 characters long.
+        yield '{0: <10} '.format(seqid[:10]) + fmt % tuple(line.tolist())
+
+
+def _pairwise_lines(id_list, rows, decimal_places, col_id_list=None):
+    """Format rows of the upper triangle of a distance matrix as
+    lines of `pairwise` format.
+
+    Args:
+        id_list (list): list of sequence identifiers
+        rows (iterable): (i, cols, values) tuples, where `values` are
+            distances between i-th sequence and sequences of indices
+            `cols` (slice or list)
+        decimal_places (int): round distance value to decimal places
+        col_id_list (list): identifiers of sequences indexed by `cols`
+            [default: id_list]
+
+    Yields:
+        string of all lines of a row
+
+    """
+    if col_id_list is None:
+        col_id_list = id_list
+    cells = ['{0}\t%.{1}f\n'.format(seqid.replace('%', '%%'), decimal_places)
+             for seqid in col_id_list]
+    for i, cols, values in rows:
+        if not len(values):
+            continue
+        if isinstance(cols, slice):
+            row_cells = cells[cols]
+        else:
+            row_cells = [cells[j] for j in cols]
+        head = id_list[i].replace('%', '%%') + '\t'
+        yield (head + head.join(row_cells)) % tuple(values.tolist())
+
+
+def _write_buffered(handle, strings):
+    """Write strings to a file in bulks of WRITE_BUFFER_SIZE characters."""
+    buf = []
+    buf_size = 0
+    for string in strings:
+        buf.append(string)
+        buf_size += len(string)
+        if buf_size >= WRITE_BUFFER_SIZE:
+            handle.write("".join(buf))
+            buf = []
+            buf_size = 0
+    if buf:
+        handle.write("".join(buf))
+
+
+def iter_tiles(size, tile_size=TILE_SIZE):
+    """Iterate over the upper-triangle tiles of a square matrix.
+
+    Args:
+        size (int): number of rows (and columns) of a matrix
+        tile_size (int): number of rows/columns of a tile
+
+    Yields:
+        (rows, cols) tuple of slices. Tiles on the diagonal have
+        rows == cols.
+
+    Examples:
+        >>> list(iter_tiles(3, 2))
+        [(slice(0, 2, None), slice(0, 2, None)),
+         (slice(0, 2, None), slice(2, 3, None)),
+         (slice(2, 3, None), slice(2, 3, None))]
+
+    """
+    if tile_size < 1:
+        raise ValueError('tile size must be >= 1')
+    for start1 in range(0, size, tile_size):
+        rows = slice(start1, min(start1 + tile_size, size))
+        for start2 in range(start1, size, tile_size):
+            cols = slice(start2, min(start2 + tile_size, size))
+            yield rows, cols
+
+
+def iter_rect_tiles(rows, cols, tile_size=TILE_SIZE):
+    """Iterate over the tiles of a rectangular part of a matrix.
+
+    Args:
+        rows (slice): row indices of the rectangular part
+        cols (slice): column indices of the rectangular part
+        tile_size (int): number of rows/columns of a tile
+
+    Yields:
+        (rows, cols) tuple of slices
+
+    Examples:
+        >>> list(iter_rect_tiles(slice(0, 1), slice(1, 4), 2))
+        [(slice(0, 1, None), slice(1, 3, None)),
+         (slice(0, 1, None), slice(3, 4, None))]
+
+    """
+    if tile_size < 1:
+        raise ValueError('tile size must be >= 1')
+    for start1 in range(rows.start, rows.stop, tile_size):
+        tile_rows = slice(start1, min(start1 + tile_size, rows.stop))
+        for start2 in range(cols.start, cols.stop, tile_size):
+            yield tile_rows, slice(start2, min(start2 + tile_size, cols.stop))
+
+
+def iter_row_chunks(size, chunks):
+    """Split the upper triangle of a square matrix into row ranges
+    holding a similar number of pairs.
+
+    Args:
+        size (int): number of rows (and columns) of a matrix
+        chunks (int): requested number of row ranges
+
+    Yields:
+        (start, stop) tuple of row indices
+
+    Examples:
+        >>> list(iter_row_chunks(5, 2))
+        [(0, 2), (2, 4)]
+
+    """
+    total = size * (size - 1) // 2
+    chunk_pairs = max(total // max(chunks, 1), 1)
+    start = 0
+    count = 0
+    for i in range(size - 1):
+        count += size - 1 - i
+        if count >= chunk_pairs:
+            yield start, i + 1
+            start = i + 1
+            count = 0
+    if start < size - 1:
+        yield start, size - 1
+
+
+# Distance object used by worker processes.
+_worker_distance = None
+
+
+def _init_worker(distance):
+    global _worker_distance
+    _worker_distance = distance
+
+
+def _compute_block(distance, rows, cols):
+    """Compute distances between sequences of indices `rows` and `cols`
+    (slices), pair by pair if the distance has no block implementation."""
+    block_distance = getattr(distance, 'block_distance', None)
+    if block_distance is not None:
+        return block_distance(rows, cols)
+    values = [[distance.pairwise_distance(i, j)
+               for j in range(cols.start, cols.stop)]
+              for i in range(rows.start, rows.stop)]
+    return np.array(values, dtype=float).reshape(rows.stop - rows.start,
+                                                 cols.stop - cols.start)
+
+
+def _compute_tile(tile):
+    rows, cols = tile
+    return rows, cols, _compute_block(_worker_distance, rows, cols)
+
+
+def _compute_rows(span):
+    start, stop, size = span
+    values = [_worker_distance.pairwise_distance(i, j)
+              for i in range(start, stop) for j in range(i + 1, size)]
+    return start, stop, np.array(values, dtype=float)
+
+
+def _create_pool(distance, workers):
+    """Create a pool of worker processes sharing a distance object.
+
+    Where possible, workers are forked, so that they share the
+    distance object (including its vectors) with the parent process
+    through copy-on-write memory instead of receiving pickled copies.
+
+    """
+    import multiprocessing
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        # Platforms without fork: pickle the distance to each worker.
+        return multiprocessing.Pool(workers, _init_worker, (distance,))
+    _init_worker(distance)
+    return context.Pool(workers)
+
+
+def _pool_imap(distance, workers, func, iterable):
+    """Map `func` over `iterable` in a pool of worker processes sharing
+    a distance object, yielding results in order."""
+    global _worker_distance
+    pool = _create_pool(distance, workers)
+    try:
+        for result in pool.imap(func, iterable):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+        _worker_distance = None
+
+
+def _iter_tile_blocks(distance, tiles, workers=1):
+    """Compute blocks of distances for (rows, cols) tiles, serially
+    or in a pool of `workers` processes."""
+    if workers > 1:
+        for block in _pool_imap(distance, workers, _compute_tile, tiles):
+            yield block
+    else:
+        for tile_rows, tile_cols in tiles:
+            yield (tile_rows, tile_cols,
+                   _compute_block(distance, tile_rows, tile_cols))
+
+
+def iter_row_bands(size, band_size):
+    """Iterate over bands of rows of the upper triangle of a square matrix.
+
+    Unlike square tiles, bands span all columns right of the diagonal,
+    so distances are produced in row-major order.
+
+    Args:
+        size (int): number of rows (and columns) of a matrix
+        band_size (int): number of rows of a band
+
+    Yields:
+        (rows, cols) tuple of slices. Bands start on the diagonal
+        (rows.start == cols.start).
+
+    Examples:
+        >>> list(iter_row_bands(3, 2))
+        [(slice(0, 2, None), slice(0, 3, None)),
+         (slice(2, 3, None), slice(2, 3, None))]
+
+    """
+    if band_size < 1:
+        raise ValueError('band size must be >= 1')
+    for start in range(0, size, band_size):
+        yield slice(start, min(start + band_size, size)), slice(start, size)
+
+
+def iter_blocks(distance, size, tile_size=TILE_SIZE, workers=1, tiles=None):
+    """Compute the upper triangle of a distance matrix block by block.
+
+    If the distance method provides a vectorized block implementation
+    (`distance.block_distance`), the matrix is computed in square tiles
+    of `tile_size` rows and columns. Otherwise, distances are computed
+    pair by pair and yielded row by row.
+
+    With `workers` > 1, tiles (or balanced chunks of upper-triangle rows,
+    for distances computed pair by pair) are distributed across a pool
+    of worker processes.
+
+    Args:
+        distance (obj): instance of distance.Distance
+        size (int): number of sequences
+        tile_size (int): number of rows/columns of a tile
+        workers (int): number of worker processes
+        tiles (iterable): (rows, cols) slices of blocks to compute with
+            the block implementation [default: iter_tiles(size, tile_size)]
+
+    Yields:
+        (rows, cols, block) tuple, where `rows` and `cols` are slices of
+        sequence indices and `block` is a 2-D array of distances between
+        them. Only values above the diagonal of the matrix are meaningful.
+
+    """
+    if tiles is None:
+        tiles = iter_tiles(size, tile_size)
+    if getattr(distance, 'block_distance', None) is not None:
+        for block in _iter_tile_blocks(distance, tiles, workers):
+            yield block
+    elif workers > 1:
+        spans = [(start, stop, size) for start, stop
+                 in iter_row_chunks(size, workers * 4)]
+        for start, stop, values in _pool_imap(distance, workers,
+                                              _compute_rows, spans):
+            offset = 0
+            for i in range(start, stop):
+                n = size - i - 1
+                yield (slice(i, i + 1), slice(i + 1, size),
+                       values[np.newaxis, offset:offset + n])
+                offset += n
+    else:
+        # No need to calculate distances between the same sequences.
+        # The distance should be zero.
+        for i in range(size - 1):
+            values = [distance.pairwise_distance(i, j)
+                      for j in range(i + 1, size)]
+            yield slice(i, i + 1), slice(i + 1, size), np.array([values])
+
+
+def iter_rect_blocks(distance, query_count, size, tile_size=TILE_SIZE,
+                     workers=1, tiles=None):
+    """Compute distances between query and reference sequences
+    block by block.
+
+    Sequences of indices 0, 1, ..., query_count-1 are queries and the
+    remaining ones are references; distances between two queries or two
+    references are not computed. The query-by-reference part of the
+    matrix is computed in tiles of `tile_size` rows and columns, with
+    the block implementation of the distance method if it exists,
+    or pair by pair otherwise.
+
+    Args:
+        distance (obj): instance of distance.Distance
+        query_count (int): number of query sequences
+        size (int): number of all (query and reference) sequences
+        tile_size (int): number of rows/columns of a tile
+        workers (int): number of worker processes
+        tiles (iterable): (rows, cols) slices of blocks to compute
+            [default: iter_rect_tiles of the query-by-reference part]
+
+    Yields:
+        (rows, cols, block) tuple, where `rows` are slices of query
+        indices, `cols` are slices of reference indices (both indexing
+        the sequences of `distance`) and `block` is a 2-D array
+        of distances between them.
+
+    """
+    if tiles is None:
+        tiles = iter_rect_tiles(slice(0, query_count),
+                                slice(query_count, size), tile_size)
+    return _iter_tile_blocks(distance, tiles, workers)
+
+
+def condensed_index(size, i, j):
+    """Return the position of distance between sequences `i` and `j`
+    (i < j) in a condensed matrix of `size` sequences."""
+    return i * (2 * size - i - 1) // 2 + j - i - 1
+
+
+def _store_square(data, tile_rows, tile_cols, block):
+    """Write a block of distances and its mirror into a square matrix."""
+    if tile_rows == tile_cols:
+        # Mirror the upper triangle to keep the matrix
+        # exactly symmetric with zeros on the diagonal.
+        block = np.triu(block, 1)
+        block += block.T
+    data[tile_rows, tile_cols] = block
+    data[tile_cols, tile_rows] = block.T
+
+
+def _store_condensed(data, size, tile_rows, tile_cols, block):
+    """Write the upper-triangle part of a block of distances into
+    a condensed matrix."""
+    for i in range(tile_rows.start, tile_rows.stop):
+        # Each row of the upper triangle is contiguous in condensed form.
+        start = max(tile_cols.start, i + 1)
+        if start >= tile_cols.stop:
+            continue
+        offset = condensed_index(size, i, start)
+        row = block[i - tile_rows.start, start - tile_cols.start:]
+        data[offset:offset + len(row)] = row
+
+
+def create(id_list, distance, tile_size=TILE_SIZE, workers=1,
+           filename=None, condensed=False, dtype=np.float64):
     """Create a distance matrix (as Matrix object).
 
-    Calculate distance measures between all pairs of sequences.
+    Calculate distance measures between all pairs of sequences
+    (see `iter_blocks`). Only the upper triangle of the matrix is computed;
+    memory used by intermediate arrays does not depend on the number
+    of sequences.
 
     Args:
         id_list (list): list of sequence identifiers
         distance (obj): instance of distance.Distance
+        tile_size (int): number of rows/columns of a tile
+        workers (int): number of worker processes
+        filename (str): if given, the matrix is written directly into
+            a memory-mapped file (see `read_memmap`) instead of RAM
+        condensed (bool): store only the upper triangle of the matrix
+            (as CondensedMatrix object)
+        dtype (numpy.dtype): type of distance values (e.g. np.float32)
 
     Returns:
         Matrix object
@@ -29,17 +435,408 @@ def create(id_list, distance):
 
     """
     size = len(id_list)
-    rows = np.zeros([size, size])
-    for i, j in itertools.combinations(range(size), 2):
-        value = distance.pairwise_distance(i, j)
-        rows[i][j] = value
-        rows[j][i] = value
-    # No need to calculate distances between the same sequences.
-    # The distance should be zero.
-    # for i in range(size):
-    #    value = distance.pairwise_distance(i, i)
-    #    rows[i][i] = value
-    return Matrix(id_list, rows)
+    shape = (size * (size - 1) // 2,) if condensed else (size, size)
+    if filename is None:
+        data = np.zeros(shape, dtype=dtype)
+    else:
+        data = _create_memmap(filename, id_list, shape, dtype)
+    blocks = iter_blocks(distance, size, tile_size, workers)
+    for tile_rows, tile_cols, block in blocks:
+        if condensed:
+            _store_condensed(data, size, tile_rows, tile_cols, block)
+        else:
+            _store_square(data, tile_rows, tile_cols, block)
+    if filename is not None:
+        data.flush()
+    if condensed:
+        return CondensedMatrix(id_list, data)
+    return Matrix(id_list, data)
+
+
+def create_rectangular(id_list, query_count, distance, tile_size=TILE_SIZE,
+                       workers=1, filename=None, dtype=np.float64):
+    """Create a matrix of distances between query and reference
+    sequences (as RectangularMatrix object).
+
+    Only distances between each query and each reference are computed
+    (see `iter_rect_blocks`), so the cost of the computation is
+    proportional to M*N rather than (M+N)^2 for M queries and N
+    references.
+
+    Args:
+        id_list (list): list of identifiers of query sequences followed
+            by identifiers of reference sequences
+        query_count (int): number of query sequences
+        distance (obj): instance of distance.Distance
+        tile_size (int): number of rows/columns of a tile
+        workers (int): number of worker processes
+        filename (str): if given, the matrix is written directly into
+            a memory-mapped file (see `read_memmap`) instead of RAM
+        dtype (numpy.dtype): type of distance values (e.g. np.float32)
+
+    Returns:
+        RectangularMatrix object
+
+    Examples:
+        >>> id_list = ['query1', 'ref1', 'ref2']
+        >>> matrix = create_rectangular(id_list, 1, dist)
+        >>> matrix.data.shape
+        (1, 2)
+
+    """
+    size = len(id_list)
+    query_ids = id_list[:query_count]
+    ref_ids = id_list[query_count:]
+    shape = (len(query_ids), len(ref_ids))
+    if filename is None:
+        data = np.zeros(shape, dtype=dtype)
+    else:
+        data = _create_memmap(filename, query_ids, shape, dtype,
+                              ref_id_list=ref_ids)
+    blocks = iter_rect_blocks(distance, query_count, size, tile_size, workers)
+    for tile_rows, tile_cols, block in blocks:
+        cols = slice(tile_cols.start - query_count,
+                     tile_cols.stop - query_count)
+        data[tile_rows, cols] = block
+    if filename is not None:
+        data.flush()
+    return RectangularMatrix(query_ids, ref_ids, data)
+
+
+def write_pairwise(handle, id_list, distance, decimal_places=7,
+                   threshold=None, workers=1, query_count=None):
+    """Compute distances between all pairs of sequences and write them
+    in the `pairwise` format without creating a distance matrix.
+
+    Distances are computed in bands of rows holding at most CHUNK_SIZE
+    values, and each band is written to the output with a single call
+    as soon as it is computed. Memory use does not depend on the number
+    of pairs and the output is identical to that of `Matrix.writer`.
+
+    Args:
+        handle : output file / sys.stdout
+        id_list (list): list of sequence identifiers
+        distance (obj): instance of distance.Distance
+        decimal_places (int): round distance value to decimal places
+        threshold (float): if given, skip pairs of sequences whose distance
+            is greater than the threshold
+        workers (int): number of worker processes
+        query_count (int): if given, the first `query_count` sequences are
+            queries and only distances between queries and the remaining
+            (reference) sequences are written (see `create_rectangular`)
+
+    """
+    size = len(id_list)
+    if query_count is None:
+        band_size = max(CHUNK_SIZE // max(size, 1), 1)
+        tiles = iter_row_bands(size, band_size)
+        blocks = iter_blocks(distance, size, workers=workers, tiles=tiles)
+        row_ids = col_ids = id_list
+        offset = 0
+    else:
+        band_size = max(CHUNK_SIZE // max(size - query_count, 1), 1)
+        tiles = ((slice(start, min(start + band_size, query_count)),
+                  slice(query_count, size))
+                 for start in range(0, query_count, band_size))
+        blocks = iter_rect_blocks(distance, query_count, size,
+                                  workers=workers, tiles=tiles)
+        row_ids = id_list[:query_count]
+        col_ids = id_list[query_count:]
+        offset = query_count
+    for tile_rows, tile_cols, block in blocks:
+        rows = []
+        for i in range(tile_rows.start, tile_rows.stop):
+            # Queries precede references, so the whole row of a
+            # query-by-reference block lies above the diagonal.
+            start = max(tile_cols.start, i + 1)
+            line = block[i - tile_rows.start, start - tile_cols.start:]
+            cols = slice(start - offset, tile_cols.stop - offset)
+            if threshold is not None:
+                keep = np.flatnonzero(line <= threshold)
+                cols = (keep + start - offset).tolist()
+                line = line[keep]
+            rows.append((i, cols, line))
+        handle.write("".join(_pairwise_lines(row_ids, rows, decimal_places,
+                                             col_ids)))
+
+
+def _merge_nearest(distances, indices, rows, cols, block):
+    """Update the k nearest neighbours of sequences of indices `rows`
+    with distances to sequences of indices `cols` (array)."""
+    k = distances.shape[1]
+    cand_d = np.concatenate([distances[rows], block], axis=1)
+    cand_i = np.concatenate(
+        [indices[rows], np.broadcast_to(cols, block.shape)], axis=1)
+    if cand_d.shape[1] > k:
+        part = np.argpartition(cand_d, k - 1, axis=1)[:, :k]
+        line_idx = np.arange(cand_d.shape[0])[:, np.newaxis]
+        cand_d = cand_d[line_idx, part]
+        cand_i = cand_i[line_idx, part]
+    distances[rows] = cand_d
+    indices[rows] = cand_i
+
+
+def nearest(id_list, distance, k, tile_size=TILE_SIZE, workers=1,
+            query_count=None):
+    """Find the k nearest neighbours of each sequence without creating
+    a distance matrix.
+
+    Distances are computed block by block (see `iter_blocks`) and each
+    block is merged into per-sequence arrays of the k smallest distances
+    found so far, so memory use is proportional to N*k rather than N^2.
+
+    Args:
+        id_list (list): list of sequence identifiers
+        distance (obj): instance of distance.Distance
+        k (int): number of nearest neighbours of each sequence
+            (at most the number of candidate neighbours)
+        tile_size (int): number of rows/columns of a tile
+        workers (int): number of worker processes
+        query_count (int): if given, the first `query_count` sequences are
+            queries and their neighbours are searched among the remaining
+            (reference) sequences only (see `create_rectangular`)
+
+    Returns:
+        NearestNeighbors object
+
+    Examples:
+        >>> id_list = ['seq1', 'seq2', 'seq3']
+        >>> neighbors = nearest(id_list, dist, 1)
+        >>> print(neighbors.format())
+        seq1    seq3    14.1774469
+        seq2    seq3    10.8166538
+        seq3    seq2    10.8166538
+
+    """
+    if k < 1:
+        raise ValueError('k must be >= 1')
+    size = len(id_list)
+    if query_count is None:
+        rows_count, offset = size, 0
+        ref_id_list = id_list
+        k = min(k, size - 1)
+        blocks = iter_blocks(distance, size, tile_size, workers)
+    else:
+        rows_count, offset = query_count, query_count
+        ref_id_list = id_list[query_count:]
+        k = min(k, size - query_count)
+        blocks = iter_rect_blocks(distance, query_count, size, tile_size,
+                                  workers)
+    k = max(k, 0)
+    distances = np.full((rows_count, k), np.inf)
+    indices = np.full((rows_count, k), -1, dtype=np.intp)
+    for tile_rows, tile_cols, block in (blocks if k else []):
+        rows = np.arange(tile_rows.start, tile_rows.stop)
+        cols = np.arange(tile_cols.start, tile_cols.stop)
+        if query_count is None and tile_rows == tile_cols:
+            # Use only the upper triangle of diagonal tiles and
+            # exclude distances between the same sequences.
+            block = np.triu(block, 1)
+            block = block + block.T
+            np.fill_diagonal(block, np.inf)
+        _merge_nearest(distances, indices, tile_rows, cols - offset, block)
+        if query_count is None:
+            # Distances are symmetric: a block also holds distances
+            # from sequences `cols` to sequences `rows`.
+            if tile_rows != tile_cols:
+                _merge_nearest(distances, indices, tile_cols, rows,
+                               block.T)
+    # Sort neighbours by distance (and by index for equal distances).
+    order = np.lexsort((indices, distances))
+    line_idx = np.arange(rows_count)[:, np.newaxis]
+    return NearestNeighbors(id_list[:rows_count], ref_id_list,
+                            indices[line_idx, order],
+                            distances[line_idx, order])
+
+
+def write(handle, id_list, distance, f='phylip', decimal_places=7,
+          workers=1, query_count=None, top_k=None):
+    """Compute distances between all pairs of sequences and write them
+    in `phylip` or `pairwise` format.
+
+    The `pairwise` format is streamed (see `write_pairwise`), whereas
+    other formats require a distance matrix to be created.
+
+    Args:
+        handle : output file / sys.stdout
+        id_list (list): list of sequence identifiers
+        distance (obj): instance of distance.Distance
+        f (str): phylip / pairwise / npz / pairwise_bin
+        decimal_places (int): round distance value to decimal places
+        workers (int): number of worker processes
+        query_count (int): if given, the first `query_count` sequences are
+            queries and only distances between queries and the remaining
+            (reference) sequences are computed (see `create_rectangular`)
+        top_k (int): if given, write only the `top_k` nearest neighbours
+            of each sequence (see `nearest`) in `pairwise` or `npz` format
+
+    """
+    if top_k is not None:
+        neighbors = nearest(id_list, distance, top_k, workers=workers,
+                            query_count=query_count)
+        neighbors.writer(handle, f, decimal_places)
+    elif f == 'pairwise':
+        write_pairwise(handle, id_list, distance, decimal_places,
+                       workers=workers, query_count=query_count)
+    elif query_count is not None:
+        matrix = create_rectangular(id_list, query_count, distance,
+                                    workers=workers)
+        matrix.writer(handle, f, decimal_places)
+    else:
+        matrix = create(id_list, distance, workers=workers,
+                        condensed=f in BINARY_FORMATS)
+        matrix.writer(handle, f, decimal_places)
+
+
+def _header_bytes(magic, header):
+    """Return bytes of a file header.
+
+    Header layout:
+        - magic bytes
+        - header length (4-byte little-endian unsigned int)
+        - header: JSON object padded with spaces to align the data
+          following the header to 64 bytes
+
+    """
+    header = json.dumps(header).encode('utf-8')
+    prefix_len = len(magic) + 4
+    header += b' ' * (-(prefix_len + len(header)) % 64)
+    return magic + struct.pack('<I', len(header)) + header
+
+
+def _read_header(filename, magic):
+    """Read a file header (see `_header_bytes`).
+
+    Returns:
+        (header, offset) tuple, where `header` is a dict and `offset`
+        is the position of data following the header
+
+    """
+    with open(filename, 'rb') as fh:
+        if fh.read(len(magic)) != magic:
+            raise ValueError('unknown distance matrix file format')
+        header_len = struct.unpack('<I', fh.read(4))[0]
+        header = json.loads(fh.read(header_len).decode('utf-8'))
+    return header, len(magic) + 4 + header_len
+
+
+def _binary_handle(handle):
+    """Return a binary stream underlying a file opened in text mode."""
+    if isinstance(handle, io.TextIOBase):
+        handle.flush()
+        return handle.buffer
+    return handle
+
+
+def _create_memmap(filename, id_list, shape, dtype=np.float64,
+                   ref_id_list=None):
+    """Create a file-backed array of zeros with a matrix header.
+
+    The header (see `_header_bytes`) starts with MEMMAP_MAGIC and holds
+    `ids`, `dtype` and `shape` keys, and `ref_ids` key for a matrix
+    of distances between query and reference sequences. Matrix values
+    follow in C order.
+
+    """
+    header = {'ids': list(id_list),
+              'dtype': np.dtype(dtype).str,
+              'shape': list(shape)}
+    if ref_id_list is not None:
+        header['ref_ids'] = list(ref_id_list)
+    header = _header_bytes(MEMMAP_MAGIC, header)
+    with open(filename, 'wb') as oh:
+        oh.write(header)
+    return np.memmap(filename, dtype=dtype, mode='r+',
+                     offset=len(header), shape=tuple(shape))
+
+
+def read_memmap(filename, mode='r'):
+    """Open a distance matrix stored in a file-backed array.
+
+    Distance values are not read into memory; they are loaded from disk
+    on demand.
+
+    Args:
+        filename (str): file created by `create(..., filename=filename)`
+        mode (str): 'r' (read-only) or 'r+' (read and write)
+
+    Returns:
+        Matrix object
+
+    """
+    header, offset = _read_header(filename, MEMMAP_MAGIC)
+    data = np.memmap(filename, dtype=np.dtype(header['dtype']), mode=mode,
+                     offset=offset, shape=tuple(header['shape']))
+    if 'ref_ids' in header:
+        return RectangularMatrix(header['ids'], header['ref_ids'], data)
+    if data.ndim == 1:
+        return CondensedMatrix(header['ids'], data)
+    return Matrix(header['ids'], data)
+
+
+def _memmap_npz_member(filename, name):
+    """Memory-map an uncompressed array stored in a .npz file."""
+    with zipfile.ZipFile(filename) as zf:
+        info = zf.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError('cannot memory-map compressed array')
+    with open(filename, 'rb') as fh:
+        # Skip the local file header of the zip member.
+        fh.seek(info.header_offset + 26)
+        name_len, extra_len = struct.unpack('<HH', fh.read(4))
+        fh.seek(name_len + extra_len, 1)
+        version = np.lib.format.read_magic(fh)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(fh)
+        else:
+            header = np.lib.format.read_array_header_2_0(fh)
+        offset = fh.tell()
+    shape, fortran_order, dtype = header
+    order = 'F' if fortran_order else 'C'
+    return np.memmap(filename, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order=order)
+
+
+def read(filename):
+    """Read a distance matrix from a binary file.
+
+    This function autodetects whether the matrix is stored as `npz`,
+    `pairwise_bin` (see `Matrix.writer`) or memory-mapped matrix
+    (see `read_memmap`). Distance values are memory-mapped rather than
+    read into memory.
+
+    Returns:
+        Matrix object
+
+    """
+    with open(filename, 'rb') as fh:
+        magic = fh.read(len(PAIRWISE_MAGIC))
+    if magic.startswith(b'PK'):
+        with np.load(filename) as npz:
+            id_list = npz['ids'].tolist()
+            ref_id_list = (npz['ref_ids'].tolist()
+                           if 'ref_ids' in npz.files else None)
+        data = _memmap_npz_member(filename, 'distances.npy')
+        if ref_id_list is not None:
+            return RectangularMatrix(id_list, ref_id_list, data)
+        return CondensedMatrix(id_list, data)
+    elif magic == PAIRWISE_MAGIC:
+        header, offset = _read_header(filename, PAIRWISE_MAGIC)
+        id_list = header['ids']
+        records = np.memmap(filename, dtype=PAIRWISE_DTYPE, mode='r',
+                            offset=offset)
+        size = len(id_list)
+        if 'ref_ids' in header:
+            shape = (size, len(header['ref_ids']))
+            if records.shape[0] != shape[0] * shape[1]:
+                raise ValueError(
+                    'binary pairwise file does not hold all pairs')
+            return RectangularMatrix(id_list, header['ref_ids'],
+                                     records['d'].reshape(shape))
+        if records.shape[0] != size * (size - 1) // 2:
+            raise ValueError('binary pairwise file does not hold all pairs')
+        return CondensedMatrix(id_list, records['d'])
+    return read_memmap(filename)
 
 
 def read_highcharts_matrix(id_list, data):
@@ -67,6 +864,11 @@ class Matrix():
     Attributes:
         id_list (list): list of sequence identifiers
         data (ndarray): 2-D array of distance values between pairs of seqs
+            (in memory or numpy.memmap)
+
+    Methods reducing or transforming distance values process the matrix
+    in chunks of rows, so a memory-mapped matrix is never loaded into
+    memory as a whole.
 
     """
 
@@ -84,41 +886,104 @@ class Matrix():
         self.id_list = id_list
         self.data = data
 
+    def _iter_chunks(self):
+        """Iterate over slices of rows holding at most CHUNK_SIZE values."""
+        size = self.data.shape[0]
+        step = max(CHUNK_SIZE // max(self.data.shape[1], 1), 1)
+        for start in range(0, size, step):
+            yield slice(start, min(start + step, size))
+
     def normalize(self):
         """Normalize distance values to 0-1 range."""
-        self.data /= self.max()
+        maxval = self.max()
+        for rows in self._iter_chunks():
+            self.data[rows] /= maxval
+
+    def _iter_rows(self):
+        """Iterate over rows of a square distance matrix."""
+        for rows in self._iter_chunks():
+            for line in np.asarray(self.data[rows]):
+                yield line
+
+    def square(self):
+        """Return a distance matrix as a square 2-D array."""
+        return self.data
+
+    def _iter_upper_rows(self):
+        """Iterate over rows of the upper triangle of a distance matrix.
+
+        Yields:
+            (i, values) tuple, where `values` are distances between i-th
+            sequence and sequences i+1, i+2, ..., n-1
+
+        """
+        for rows in self._iter_chunks():
+            block = np.asarray(self.data[rows])
+            for i, line in zip(range(rows.start, rows.stop), block):
+                yield i, line[i + 1:]
 
     def __iter__(self):
         """Iterate over a distance matrix."""
-        size = self.data.shape[0]
-        for i, j in itertools.combinations(range(size), 2):
-            yield i, j, self.id_list[i], self.id_list[j], self.data[i][j]
+        for i, line in self._iter_upper_rows():
+            for j, distval in enumerate(line, i + 1):
+                yield i, j, self.id_list[i], self.id_list[j], distval
+
+    def condensed(self):
+        """Return distances above the diagonal as a 1-D array
+        (see CondensedMatrix)."""
+        size = len(self.id_list)
+        values = np.empty(size * (size - 1) // 2, dtype=self.data.dtype)
+        offset = 0
+        for _, line in self._iter_upper_rows():
+            values[offset:offset + len(line)] = line
+            offset += len(line)
+        return values
 
     def writer(self, handle, f, decimal_places):
         """Return a distance matrix as a string in `phylip` or `pairwise`
-        formats.
+        formats, or as bytes in `npz` or `pairwise_bin` formats.
+
+        Binary formats:
+            npz: numpy .npz archive holding `ids` (sequence identifiers)
+                 and `distances` (see `condensed`) arrays.
+            pairwise_bin: PAIRWISE_MAGIC header with sequence identifiers
+                 followed by (uint32 i, uint32 j, float32 distance)
+                 records of all pairs of sequences.
+
+        Both formats can be memory-mapped by `read`.
 
         Args:
             handle : output file / sys.stdout
-            f (str): phylip / pairwise
+            f (str): phylip / pairwise / npz / pairwise_bin
             decimal_places (int): round distance value to decimal places
+                (ignored by binary formats)
 
         """
         if f == 'phylip':
-            handle.write("   {0}\n".format(len(self.id_list)))
-            for i, line in enumerate(self.data):
-                # PHYLIP requires that each sequence identifier
-                # is maximum 10 characters long.
-                seqid = self.id_list[i][:10]
-                l = ['{0:.{1}f}'.format(line[i], decimal_places)
-                     for i in range(0, len(line))]
-                l.insert(0, '{0: <10}'.format(seqid))
-                handle.write(" ".join(l) + "\n")
+            handle.write(self._phylip_header() + "\n")
+            lines = _phylip_lines(self.id_list, self._iter_rows(),
+                                  decimal_places)
+            _write_buffered(handle, (line + "\n" for line in lines))
         elif f == 'pairwise':
-            for _, _, seqid1, seqid2, distval in self:
-                handle.write("{0}\t{1}\t{2:.{3}f}\n".format(seqid1, seqid2,
-                                                            distval,
-                                                            decimal_places))
+            size = len(self.id_list)
+            rows = ((i, slice(i + 1, size), values)
+                    for i, values in self._iter_upper_rows())
+            _write_buffered(handle, _pairwise_lines(self.id_list, rows,
+                                                    decimal_places))
+        elif f == 'npz':
+            np.savez(_binary_handle(handle), ids=np.array(self.id_list),
+                     distances=self.condensed())
+        elif f == 'pairwise_bin':
+            handle = _binary_handle(handle)
+            handle.write(_header_bytes(PAIRWISE_MAGIC,
+                                       {'ids': list(self.id_list)}))
+            size = len(self.id_list)
+            for i, line in self._iter_upper_rows():
+                records = np.empty(len(line), dtype=PAIRWISE_DTYPE)
+                records['i'] = i
+                records['j'] = np.arange(i + 1, size)
+                records['d'] = line
+                handle.write(records.tobytes())
 
     def display(self, f="phylip", decimal_places=7):
         """Write a distance matrix to the screen."""
@@ -136,32 +1001,283 @@ class Matrix():
             data.append([i, j, distval / maxval, distval])
         return data
 
+    def _phylip_header(self):
+        """Return the first line of a matrix in PHYLIP format."""
+        return "   {0}".format(len(self.id_list))
+
     def format(self, decimal_places=7):
-        lines = ["   {0}".format(len(self.id_list))]
-        for i, line in enumerate(self.data):
-            seqid = self.id_list[i][:10]
-            l = ['{0:.{1}f}'.format(line[i], decimal_places)
-                 for i in range(0, len(line))]
-            l.insert(0, '{0: <10}'.format(seqid))
-            lines.append("\n" + " ".join(l))
-        return "".join(lines)
+        lines = [self._phylip_header()]
+        lines.extend(_phylip_lines(self.id_list, self._iter_rows(),
+                                   decimal_places))
+        return "\n".join(lines)
 
     def min(self):
         """Return minimum distance value in matrix"""
-        return np.amin(self.data)
+        return min(np.amin(self.data[rows]) for rows in self._iter_chunks())
 
     def max(self):
         """Return maximum distance value in matrix"""
-        return np.amax(self.data)
+        return max(np.amax(self.data[rows]) for rows in self._iter_chunks())
 
     def is_zero(self):
         """Return True if matrix contains only zeros"""
-        return not np.count_nonzero(self.data)
+        return not any(np.count_nonzero(self.data[rows])
+                       for rows in self._iter_chunks())
 
     def __repr__(self):
         return str(self.data)
 
 
+class CondensedMatrix(Matrix):
+    """Distance matrix storing only distances above the diagonal.
+
+    Distances are symmetric and distances between the same sequences
+    are zero, so the upper triangle holds all information of a matrix
+    in n*(n-1)/2 values. The square form is created only on request
+    (see `square`).
+
+    Attributes:
+        id_list (list): list of sequence identifiers
+        data (ndarray): 1-D array of distance values (in memory or
+            numpy.memmap) ordered row by row: (0, 1), (0, 2), ...,
+            (0, n-1), (1, 2), ..., (n-2, n-1)
+
+    """
+
+    def _iter_chunks(self):
+        """Iterate over slices of at most CHUNK_SIZE values."""
+        size = self.data.shape[0]
+        for start in range(0, size, CHUNK_SIZE):
+            yield slice(start, min(start + CHUNK_SIZE, size))
+
+    def _row(self, i):
+        """Return i-th row of the square distance matrix."""
+        size = len(self.id_list)
+        line = np.zeros(size, dtype=self.data.dtype)
+        # Column i above the diagonal (j < i), mirrored.
+        j = np.arange(i)
+        line[:i] = self.data[j * (2 * size - j - 1) // 2 + i - j - 1]
+        offset = condensed_index(size, i, i + 1)
+        line[i + 1:] = self.data[offset:offset + size - i - 1]
+        return line
+
+    def _iter_rows(self):
+        """Iterate over rows of a square distance matrix."""
+        for i in range(len(self.id_list)):
+            yield self._row(i)
+
+    def condensed(self):
+        """Return distances above the diagonal as a 1-D array."""
+        return self.data
+
+    def square(self):
+        """Return a distance matrix as a square 2-D array."""
+        size = len(self.id_list)
+        data = np.zeros([size, size], dtype=self.data.dtype)
+        i, j = np.triu_indices(size, 1)
+        data[i, j] = self.data
+        data[j, i] = self.data
+        return data
+
+    def _iter_upper_rows(self):
+        """Iterate over rows of the upper triangle of a distance matrix."""
+        size = len(self.id_list)
+        offset = 0
+        for i in range(size):
+            yield i, np.asarray(self.data[offset:offset + size - i - 1])
+            offset += size - i - 1
+
+    def min(self):
+        """Return minimum distance value in matrix"""
+        # Diagonal of the square matrix consists of zeros.
+        if not self.data.shape[0]:
+            return 0.0
+        return min(Matrix.min(self), 0.0)
+
+    def max(self):
+        """Return maximum distance value in matrix"""
+        if not self.data.shape[0]:
+            return 0.0
+        return max(Matrix.max(self), 0.0)
+
+
+class RectangularMatrix(Matrix):
+    """Matrix of distances between query and reference sequences.
+
+    Unlike a square distance matrix, rows and columns correspond to
+    different sets of sequences, so the matrix is neither symmetric
+    nor has zeros on the diagonal.
+
+    Attributes:
+        id_list (list): list of query sequence identifiers
+        ref_id_list (list): list of reference sequence identifiers
+        data (ndarray): 2-D array of distance values (in memory or
+            numpy.memmap) of shape (len(id_list), len(ref_id_list))
+
+    """
+
+    def __init__(self, id_list, ref_id_list, data):
+        """
+        Example:
+            >>> id_list = ['query1']
+            >>> ref_id_list = ['ref1', 'ref2']
+            >>> data
+            [[ 0.3531587   0.35509333]]
+            >>> matrix = RectangularMatrix(id_list, ref_id_list, data)
+
+        """
+        Matrix.__init__(self, id_list, data)
+        self.ref_id_list = ref_id_list
+
+    def square(self):
+        raise ValueError('matrix of query-reference distances is not square')
+
+    def condensed(self):
+        raise ValueError('matrix of query-reference distances is not square')
+
+    def __iter__(self):
+        """Iterate over a distance matrix.
+
+        Yields:
+            (i, j, query_id, ref_id, distance) tuples, where `i` indexes
+            queries and `j` indexes references
+
+        """
+        for i, line in enumerate(self._iter_rows()):
+            for j, distval in enumerate(line):
+                yield i, j, self.id_list[i], self.ref_id_list[j], distval
+
+    def _phylip_header(self):
+        return "   {0} {1}".format(len(self.id_list), len(self.ref_id_list))
+
+    def writer(self, handle, f, decimal_places):
+        """Write a matrix of query-reference distances.
+
+        Formats:
+            phylip: PHYLIP-like table with a row of distances for each
+                 query; columns follow the order of reference sequences
+                 and the first line holds numbers of queries and references.
+            pairwise: query identifier, reference identifier and distance
+                 for all query-reference pairs.
+            npz: as for Matrix, with additional `ref_ids` array and
+                 `distances` of shape (queries, references).
+            pairwise_bin: as for Matrix, with additional `ref_ids` header
+                 key; `j` of records indexes reference sequences.
+
+        Args:
+            handle : output file / sys.stdout
+            f (str): phylip / pairwise / npz / pairwise_bin
+            decimal_places (int): round distance value to decimal places
+                (ignored by binary formats)
+
+        """
+        if f == 'pairwise':
+            cols = slice(0, len(self.ref_id_list))
+            rows = ((i, cols, line)
+                    for i, line in enumerate(self._iter_rows()))
+            _write_buffered(handle, _pairwise_lines(self.id_list, rows,
+                                                    decimal_places,
+                                                    self.ref_id_list))
+        elif f == 'npz':
+            np.savez(_binary_handle(handle), ids=np.array(self.id_list),
+                     ref_ids=np.array(self.ref_id_list),
+                     distances=np.asarray(self.data))
+        elif f == 'pairwise_bin':
+            handle = _binary_handle(handle)
+            handle.write(_header_bytes(PAIRWISE_MAGIC,
+                                       {'ids': list(self.id_list),
+                                        'ref_ids': list(self.ref_id_list)}))
+            cols = np.arange(len(self.ref_id_list))
+            for i, line in enumerate(self._iter_rows()):
+                records = np.empty(len(line), dtype=PAIRWISE_DTYPE)
+                records['i'] = i
+                records['j'] = cols
+                records['d'] = line
+                handle.write(records.tobytes())
+        else:
+            Matrix.writer(self, handle, f, decimal_places)
+
+
+class NearestNeighbors():
+    """Table of the k nearest neighbours of sequences (see `nearest`).
+
+    Attributes:
+        id_list (list): list of sequence identifiers
+        ref_id_list (list): list of identifiers of candidate neighbours
+            (same as `id_list`, unless neighbours of query sequences
+            were searched among reference sequences)
+        indices (ndarray): 2-D array of shape (len(id_list), k) with
+            indices (in `ref_id_list`) of neighbours of each sequence,
+            ordered from the nearest
+        distances (ndarray): 2-D array of shape (len(id_list), k) with
+            distances to the neighbours
+
+    """
+
+    def __init__(self, id_list, ref_id_list, indices, distances):
+        self.id_list = id_list
+        self.ref_id_list = ref_id_list
+        self.indices = indices
+        self.distances = distances
+
+    def __iter__(self):
+        """Iterate over neighbours of sequences.
+
+        Yields:
+            (i, j, seqid, neighbor_id, distance) tuples
+
+        """
+        for i in range(len(self.id_list)):
+            for j, distval in zip(self.indices[i], self.distances[i]):
+                yield i, j, self.id_list[i], self.ref_id_list[j], distval
+
+    def writer(self, handle, f, decimal_places):
+        """Write nearest neighbours of sequences.
+
+        Formats:
+            pairwise: sequence identifier, neighbour identifier and
+                distance, one line per neighbour, from the nearest one.
+            npz: numpy .npz archive holding `ids`, `ref_ids`, `indices`
+                and `distances` arrays (see class attributes).
+
+        Args:
+            handle : output file / sys.stdout
+            f (str): pairwise / npz
+            decimal_places (int): round distance value to decimal places
+
+        """
+        if f == 'pairwise':
+            rows = ((i, self.indices[i].tolist(), self.distances[i])
+                    for i in range(len(self.id_list)))
+            _write_buffered(handle, _pairwise_lines(self.id_list, rows,
+                                                    decimal_places,
+                                                    self.ref_id_list))
+        elif f == 'npz':
+            np.savez(_binary_handle(handle), ids=np.array(self.id_list),
+                     ref_ids=np.array(self.ref_id_list),
+                     indices=self.indices, distances=self.distances)
+        else:
+            msg = 'unsupported format of nearest neighbours "{}"'.format(f)
+            raise ValueError(msg)
+
+    def display(self, f="pairwise", decimal_places=7):
+        """Write nearest neighbours to the screen."""
+        return self.writer(sys.stdout, f, decimal_places)
+
+    def write_to_file(self, handle, f="pairwise", decimal_places=7):
+        """Write nearest neighbours to a file."""
+        return self.writer(handle, f, decimal_places)
+
+    def format(self, decimal_places=7):
+        rows = ((i, self.indices[i].tolist(), self.distances[i])
+                for i in range(len(self.id_list)))
+        lines = _pairwise_lines(self.id_list, rows, decimal_places,
+                                self.ref_id_list)
+        return "".join(lines).rstrip("\n")
+
+    def __repr__(self):
+        return str(self.distances)
+
 
 if __name__ == '__main__':
     id_list = ['seq1', 'seq2', 'seq3']
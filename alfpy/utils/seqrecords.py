@@ -112,6 +112,26 @@ def read_fasta(handle):
     return SeqRecords(id_list=id_list, seq_list=seq_list)
 
 
+def merge(*seq_records_list):
+    """Concatenate collections of sequence records into a new one.
+
+    Args:
+        seq_records_list : SeqRecords objects
+
+    Example:
+        >>> seq_records = merge(query_records, ref_records)
+        >>> seq_records.count == query_records.count + ref_records.count
+        True
+
+    """
+    id_list = []
+    seq_list = []
+    for seq_records in seq_records_list:
+        id_list.extend(seq_records.id_list)
+        seq_list.extend(seq_records.seq_list)
+    return SeqRecords(id_list=id_list, seq_list=seq_list)
+
+
 def main():
     seq_records = SeqRecords()
     seq_records.add(
@@ -0,0 +1,220 @@
+"""Compressed sparse row (CSR) matrix of sequence vectors.
+
+Word vectors of large word sizes are mostly zeros (e.g. protein 5-mers
+give 3.2 million possible words, of which a sequence contains at most a
+few hundred). `CSRMatrix` stores only the nonzero values of each row
+(sequence) and supports the subset of ndarray operations that is used
+by vector and distance classes.
+
+"""
+
+import numpy as np
+
+
+class CSRMatrix(object):
+    """2-D matrix storing nonzero values of each row.
+
+    Values of i-th row are stored in `data[indptr[i]:indptr[i + 1]]`
+    and their column indices (ascending) in
+    `indices[indptr[i]:indptr[i + 1]]`.
+
+    Attributes:
+        data (ndarray)    : nonzero values
+        indices (ndarray) : column indices of values
+        indptr (ndarray)  : offsets of rows
+        shape (tuple)     : number of rows and columns
+
+    """
+
+    def __init__(self, data, indices, indptr, shape):
+        """Create a CSRMatrix instance.
+
+        Examples:
+            >>> m = CSRMatrix([3., 1., 2.], [0, 2, 1], [0, 2, 3], (2, 3))
+            >>> m.toarray()
+            array([[3., 0., 1.],
+                   [0., 2., 0.]])
+
+        """
+        self.data = np.asarray(data)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.shape = (int(shape[0]), int(shape[1]))
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape, dtype=float):
+        """Create a CSRMatrix from (row, column, value) triples.
+
+        Triples must not repeat (row, column) pairs.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        data = np.asarray(values, dtype=dtype)[order]
+        return cls(data, cols[order], indptr, shape)
+
+    @property
+    def nnz(self):
+        """Number of stored values."""
+        return len(self.data)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def row_indices(self):
+        """Return row index of each stored value."""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def toarray(self):
+        """Return the matrix as a dense 2-D ndarray."""
+        array = np.zeros(self.shape, dtype=self.dtype)
+        array[self.row_indices(), self.indices] = self.data
+        return array
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.toarray()
+        return array if dtype is None else array.astype(dtype)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(self.shape[0]):
+            yield self[i]
+
+    def __getitem__(self, key):
+        """Return i-th row as dense 1-D ndarray, or rows selected by
+        slice/array of indices as a CSRMatrix."""
+        if isinstance(key, (int, np.integer)):
+            start, stop = self.indptr[key], self.indptr[key + 1]
+            row = np.zeros(self.shape[1], dtype=self.dtype)
+            row[self.indices[start:stop]] = self.data[start:stop]
+            return row
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.shape[0])
+            if step == 1:
+                stop = max(start, stop)
+                bounds = self.indptr[start:stop + 1]
+                return self.__class__(
+                    self.data[bounds[0]:bounds[-1]],
+                    self.indices[bounds[0]:bounds[-1]],
+                    bounds - bounds[0], (stop - start, self.shape[1]))
+            key = np.arange(start, stop, step)
+        rows = np.asarray(key, dtype=np.int64)
+        lengths = np.diff(self.indptr)[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # Positions of stored values of the selected rows.
+        pos = np.arange(indptr[-1]) + np.repeat(
+            self.indptr[rows] - indptr[:-1], lengths)
+        return self.__class__(self.data[pos], self.indices[pos], indptr,
+                              (len(rows), self.shape[1]))
+
+    def astype(self, dtype, copy=True):
+        data = self.data.astype(dtype, copy=copy)
+        if data is self.data:
+            return self
+        return self.__class__(data, self.indices, self.indptr, self.shape)
+
+    def _broadcast(self, other):
+        """Return values of `other` matching stored values.
+
+        `other` is a scalar, a 1-D array of column values, or a 2-D
+        array of shape (rows, 1) of row values.
+        """
+        other = np.asarray(other)
+        if other.ndim == 0:
+            return other
+        if other.ndim == 1 and other.shape[0] == self.shape[1]:
+            return other[self.indices]
+        if other.shape == (self.shape[0], 1):
+            return np.repeat(other[:, 0], np.diff(self.indptr))
+        raise ValueError('operands could not be broadcast together with '
+                         'shapes {} {}'.format(self.shape, other.shape))
+
+    def _with_data(self, data):
+        return self.__class__(data, self.indices, self.indptr, self.shape)
+
+    def __mul__(self, other):
+        return self._with_data(self.data * self._broadcast(other))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self._with_data(self.data / self._broadcast(other))
+
+    __div__ = __truediv__
+
+    def __pow__(self, other):
+        return self._with_data(self.data ** other)
+
+    def sum(self, axis=None, dtype=None, out=None):
+        """Sum of values over all (axis=None), rows (axis=1) or columns
+        (axis=0) of the matrix."""
+        if axis is None:
+            return self.data.sum(dtype=dtype)
+        if axis in (1, -1):
+            value = np.bincount(self.row_indices(), weights=self.data,
+                                minlength=self.shape[0])
+        elif axis == 0:
+            value = np.bincount(self.indices, weights=self.data,
+                                minlength=self.shape[1])
+        else:
+            raise ValueError('axis {} is out of bounds'.format(axis))
+        return value if dtype is None else value.astype(dtype)
+
+
+def block_reduce(func, x, y, buffer_size):
+    """Sum `func(x_i, y_j)` over vector elements for all pairs of rows
+    of two CSR matrices.
+
+    Only columns nonzero in both rows are evaluated with `func(u, v)`.
+    Columns nonzero in one of the rows contribute `func(u, 0)` or
+    `func(0, v)`, and `func(0, 0)` must be 0.
+
+    Args:
+        func (ufunc): element-wise function of two arrays (e.g. np.minimum)
+        x (CSRMatrix): vectors, shape (M, K)
+        y (CSRMatrix): vectors, shape (N, K)
+        buffer_size (int): maximum number of pairs of values
+            evaluated at once
+
+    Returns:
+        ndarray of shape (M, N)
+
+    """
+    m, n = x.shape[0], y.shape[0]
+    xrows = x.row_indices()
+    yrows = y.row_indices()
+    xdata = x.data.astype(float, copy=False)
+    ydata = y.data.astype(float, copy=False)
+    value = np.zeros((m, n))
+    xzero = func(xdata, 0.0)
+    yzero = func(0.0, ydata)
+    value += np.bincount(xrows, weights=xzero, minlength=m)[:, np.newaxis]
+    value += np.bincount(yrows, weights=yzero, minlength=n)[np.newaxis, :]
+
+    # Pair every value of x with values of y in the same column.
+    xorder = np.argsort(x.indices, kind='stable')
+    yorder = np.argsort(y.indices, kind='stable')
+    ycols = y.indices[yorder]
+    lo = np.searchsorted(ycols, x.indices[xorder], 'left')
+    counts = np.searchsorted(ycols, x.indices[xorder], 'right') - lo
+    cumcounts = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        stop = np.searchsorted(cumcounts, cumcounts[start] - counts[start] +
+                               buffer_size, 'right')
+        stop = max(stop, start + 1)
+        c = counts[start:stop]
+        offsets = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        xi = xorder[np.repeat(np.arange(start, stop), c)]
+        yi = yorder[np.repeat(lo[start:stop], c) + offsets]
+        w = func(xdata[xi], ydata[yi]) - xzero[xi] - yzero[yi]
+        value += np.bincount(xrows[xi] * n + yrows[yi], weights=w,
+                             minlength=m * n).reshape(m, n)
+        start = stop
+    return value
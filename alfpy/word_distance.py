@@ -73,6 +73,12 @@ class Distance(distance.Distance):
         value = d / (float(seqlen[seq1idx] + seqlen[seq2idx]) / 2)
         return value
 
+    def blockdist_euclid_seqlen1(self, seq1idxs, seq2idxs):
+        """A variant of Euclidean distance between two sets of seqs."""
+        seqlen = np.asarray(self._vector.seq_lengths, dtype=float)
+        d = self.blockdist_euclid_squared(seq1idxs, seq2idxs)
+        return d / (np.add.outer(seqlen[seq1idxs], seqlen[seq2idxs]) / 2)
+
     def pwdist_euclid_seqlen2(self, seq1idx, seq2idx):
         """A variant of Euclidean distance
 
@@ -92,6 +98,15 @@ class Distance(distance.Distance):
 
         return value
 
+    def blockdist_euclid_seqlen2(self, seq1idxs, seq2idxs):
+        """A variant of Euclidean distance between two sets of seqs."""
+        seqlen = np.asarray(self._vector.seq_lengths, dtype=float)
+        x = self._block_vectors(seq1idxs)
+        y = self._block_vectors(seq2idxs)
+        x = x / np.sqrt(seqlen[seq1idxs])[:, np.newaxis]
+        y = y / np.sqrt(seqlen[seq2idxs])[:, np.newaxis]
+        return distance.block_euclid_squared(x, y)
+
     def __angle_cos(self, seq1idx, seq2idx):
         """Cosine of the angle between two vectors in the N-dimensional space
         of composition vectors. The value may vary between -1 and 1.
@@ -107,6 +122,17 @@ class Distance(distance.Distance):
         value = nom / (math.sqrt(sum1) * math.sqrt(sum2))
         return value
 
+    def __block_angle_cos(self, seq1idxs, seq2idxs):
+        """Cosines of the angles between two sets of vectors."""
+        x = self._block_vectors(seq1idxs)
+        y = self._block_vectors(seq2idxs)
+        nom = distance.block_dot(x, y)
+        sum1 = np.sum(x**2, axis=1)
+        sum2 = np.sum(y**2, axis=1)
+        value = nom / np.outer(np.sqrt(sum1), np.sqrt(sum2))
+        # Rounding errors of matrix product may exceed the [-1, 1] range.
+        return np.clip(value, -1.0, 1.0)
+
     def pwdist_angle_cos_diss(self, seq1idx, seq2idx):
         """Angled-based composition distance. The distance is normalized
         to the interval (0, 1).
@@ -117,6 +143,10 @@ class Distance(distance.Distance):
         value = (1 - self.__angle_cos(seq1idx, seq2idx)) / 2
         return value
 
+    def blockdist_angle_cos_diss(self, seq1idxs, seq2idxs):
+        """Angled-based composition distances between two sets of seqs."""
+        return (1 - self.__block_angle_cos(seq1idxs, seq2idxs)) / 2
+
     def pwdist_angle_cos_evol(self, seq1idx, seq2idx):
         """Angled-based evolutionary distance
 
@@ -130,11 +160,21 @@ class Distance(distance.Distance):
         value = -math.log((1 + self.__angle_cos(seq1idx, seq2idx)) / 2)
         return value
 
+    def blockdist_angle_cos_evol(self, seq1idxs, seq2idxs):
+        """Angled-based evolutionary distances between two sets of seqs."""
+        return -np.log((1 + self.__block_angle_cos(seq1idxs, seq2idxs)) / 2)
+
     def pwdist_manhattan(self, seq1idx, seq2idx):
         """Manhattan (a.k.a. city block) distance between two vectors."""
         value = np.sum(np.absolute(self[seq1idx] - self[seq2idx]))
         return value
 
+    def blockdist_manhattan(self, seq1idxs, seq2idxs):
+        """Manhattan distances between two sets of vectors."""
+        x = self._block_vectors(seq1idxs)
+        y = self._block_vectors(seq2idxs)
+        return distance.block_reduce(lambda u, v: np.absolute(u - v), x, y)
+
     def pwdist_diff_abs_add(self, seq1idx, seq2idx):
         """
         References:
@@ -16,9 +16,32 @@ TODO:
     * alfree_format teiresias_format index out of range
 
 """
+import gzip
+import io
+import json
+import numpy as np
+import os
+import re
+import struct
+
 from alfpy.utils import seqrecords
 
 
+# Maximum number of sequence characters encoded at once while counting
+# words with integer-encoded k-mers (see `_count_kmers`).
+COUNT_CHUNK_SIZE = 2**24
+
+# Number of bytes read at once from a FASTA file by `create_from_bigfasta`.
+FASTA_BLOCK_SIZE = 2**22
+
+# First bytes of a file storing a word pattern in binary format
+# (see `write_binary`); the last byte is the format version.
+PATTERN_MAGIC = b'ALFPYWP1'
+
+# Complementary nucleotides (incl. purine/pyrimidine reduced alphabet).
+COMPLEMENT = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'R': 'Y', 'Y': 'R'}
+
+
 class Pattern:
     """Store information on words that are present in sequences.
     Pattern may include wildcards (dots and brackets).
@@ -222,8 +245,7 @@ class Pattern:
 
         """
         def revcomp(s):
-            d = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A', 'R': 'Y', 'Y': 'R'}
-            return "".join(d.get(base, base) for base in s[::-1])
+            return "".join(COMPLEMENT.get(base, base) for base in s[::-1])
 
         d = {}
         for i, word in enumerate(self.pat_list):
@@ -247,7 +269,623 @@ class Pattern:
         return self.format()
 
 
-def _create_wordpattern(seq_list, k):
+def _translate_words(words, table):
+    """Translate characters of words (numpy unicode array) according to
+    a dict of single-character translations."""
+    width = words.dtype.itemsize // 4
+    if not len(words) or not width:
+        return words
+    chars = np.ascontiguousarray(words, dtype='U{}'.format(width))
+    chars = chars.view(np.uint32).reshape(len(words), width)
+    uniq, inverse = np.unique(chars, return_inverse=True)
+    # Zeros pad words shorter than the array item size.
+    mapped = np.array([ord(table.get(chr(c), chr(c))) if c else 0
+                       for c in uniq.tolist()], dtype=np.uint32)
+    chars = mapped[inverse.reshape(chars.shape)]
+    return chars.view('U{}'.format(width)).ravel()
+
+
+def _reverse_words(words):
+    """Reverse words (numpy unicode array) of any lengths."""
+    width = words.dtype.itemsize // 4
+    if not len(words) or not width:
+        return words
+    chars = np.ascontiguousarray(words, dtype='U{}'.format(width))
+    chars = chars.view(np.uint32).reshape(len(words), width)
+    lengths = np.count_nonzero(chars, axis=1)
+    idx = lengths[:, np.newaxis] - 1 - np.arange(width)
+    rev = chars[np.arange(len(words))[:, np.newaxis], np.maximum(idx, 0)]
+    rev[idx < 0] = 0
+    return rev.view('U{}'.format(width)).ravel()
+
+
+class ArrayPattern(Pattern):
+    """Word pattern storing numbers of word occurrences in compressed
+    sparse row (CSR) arrays instead of per-word dicts.
+
+    Occurrences of i-th word are stored in
+    `seq_idx[indptr[i]:indptr[i + 1]]` (indices of sequences, ascending)
+    and `counts[indptr[i]:indptr[i + 1]]` (number of times the word is
+    present in these sequences). Each occurrence takes 8 bytes instead
+    of a dict entry with two Python integers.
+
+    Attributes:
+        words (ndarray)   : 1-D array of words (numpy unicode strings)
+        indptr (ndarray)  : offsets of occurrences of each word
+        seq_idx (ndarray) : sequence indices of occurrences (int32)
+        counts (ndarray)  : numbers of occurrences (int32)
+        positions (ndarray) : positions of words in sequences (int32),
+                            `counts[j]` consecutive positions for j-th
+                            occurrence, or None if positions are not
+                            recorded
+        count (int)       : number of words
+        pat_list (list)   : list of words (created on first use)
+        occr_list (list)  : list of dicts {seqidx: count} (created on
+                            first use)
+        pos_list (list)   : list of dicts {seqidx: [positions]} (created
+                            on first use; empty if positions are not
+                            recorded)
+
+    """
+
+    def __init__(self, words, indptr, seq_idx, counts, positions=None):
+        """Create an ArrayPattern instance.
+
+        Examples:
+            >>> words = ['ATGC', 'CGCG', 'GCAT']
+            >>> indptr = [0, 2, 3, 4]
+            >>> seq_idx = [0, 1, 2, 0]
+            >>> counts = [1, 2, 2, 3]
+            >>> pattern = ArrayPattern(words, indptr, seq_idx, counts)
+
+        """
+        self.words = np.asarray(words, dtype=str)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.seq_idx = np.asarray(seq_idx, dtype=np.int32)
+        self.counts = np.asarray(counts, dtype=np.int32)
+        self.positions = (None if positions is None else
+                          np.asarray(positions, dtype=np.int32))
+        self.count = len(self.words)
+        self._pat_list = None
+        self._occr_list = None
+        self._pos_list = None
+
+    @classmethod
+    def from_pattern(cls, pattern):
+        """Create an ArrayPattern from a Pattern storing `occr_list`
+        (and `pos_list`, if word positions are recorded)."""
+        lengths = [len(occr) for occr in pattern.occr_list]
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        seq_idx = np.empty(indptr[-1], dtype=np.int32)
+        counts = np.empty(indptr[-1], dtype=np.int32)
+        for i, occr in enumerate(pattern.occr_list):
+            items = sorted(occr.items())
+            seq_idx[indptr[i]:indptr[i + 1]] = [seqidx for seqidx, _ in items]
+            counts[indptr[i]:indptr[i + 1]] = [count for _, count in items]
+        positions = None
+        if pattern.pos_list:
+            positions = [pos for d in pattern.pos_list
+                         for seqidx in sorted(d) for pos in d[seqidx]]
+        return cls(pattern.pat_list, indptr, seq_idx, counts, positions)
+
+    @property
+    def pat_list(self):
+        if self._pat_list is None:
+            self._pat_list = self.words.tolist()
+        return self._pat_list
+
+    @property
+    def occr_list(self):
+        if self._occr_list is None:
+            seq_idx = self.seq_idx.tolist()
+            counts = self.counts.tolist()
+            bounds = self.indptr.tolist()
+            self._occr_list = [
+                dict(zip(seq_idx[start:stop], counts[start:stop]))
+                for start, stop in zip(bounds[:-1], bounds[1:])]
+        return self._occr_list
+
+    @property
+    def pos_list(self):
+        if self.positions is None:
+            return []
+        if self._pos_list is None:
+            positions = self.positions.tolist()
+            bounds = np.zeros(len(self.counts) + 1, dtype=np.int64)
+            np.cumsum(self.counts, out=bounds[1:])
+            bounds = bounds.tolist()
+            seq_idx = self.seq_idx.tolist()
+            words = self.indptr.tolist()
+            self._pos_list = [
+                {seq_idx[j]: positions[bounds[j]:bounds[j + 1]]
+                 for j in range(start, stop)}
+                for start, stop in zip(words[:-1], words[1:])]
+        return self._pos_list
+
+    @property
+    def word_idx(self):
+        """Return word index of each occurrence (row indices of CSR)."""
+        return np.repeat(np.arange(self.count), np.diff(self.indptr))
+
+    def _alfree_format(self):
+        """Return word patterns as a list of 4-element tuples
+        (see `Pattern._alfree_format`)."""
+        seqs_counts = np.diff(self.indptr)
+        occr_counts = np.bincount(self.word_idx, weights=self.counts,
+                                  minlength=self.count).astype(np.int64)
+        seq_idx = self.seq_idx.tolist()
+        counts = self.counts.tolist()
+        bounds = self.indptr.tolist()
+        lines = []
+        for i, word in enumerate(self.pat_list):
+            l = ['{0}:{1}'.format(n, c) for n, c in
+                 zip(seq_idx[bounds[i]:bounds[i + 1]],
+                     counts[bounds[i]:bounds[i + 1]])]
+            lines.append((int(occr_counts[i]), int(seqs_counts[i]), word,
+                          " ".join(l)))
+        lines.sort(reverse=False, key=lambda el: (-el[0], -el[1], el[2]))
+        return lines
+
+    def _merge_words(self, words):
+        """Merge occurrences of words that became equal.
+
+        Args:
+            words (ndarray): new word for each word of the pattern
+
+        Returns:
+            ArrayPattern with distinct words ordered by their first
+            appearance in `words`
+
+        """
+        uniq, first, inverse = np.unique(words, return_index=True,
+                                         return_inverse=True)
+        order = np.argsort(first, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        group = np.repeat(rank[inverse.ravel()], np.diff(self.indptr))
+        order = np.lexsort((self.seq_idx, group))
+        group = group[order]
+        seq_idx = self.seq_idx[order]
+        new = np.ones(len(group), dtype=bool)
+        new[1:] = (group[1:] != group[:-1]) | (seq_idx[1:] != seq_idx[:-1])
+        starts = np.flatnonzero(new)
+        counts = np.add.reduceat(self.counts[order], starts) if len(
+            starts) else self.counts[:0]
+        indptr = np.searchsorted(group[starts], np.arange(len(uniq) + 1))
+        return self.__class__(uniq[np.argsort(first, kind='stable')],
+                              indptr, seq_idx[starts], counts)
+
+    def reduce_alphabet(self, alphabet_dict):
+        """Reduce the words' nt/aa alphabet to smaller number of symbols
+        (see `Pattern.reduce_alphabet`).
+
+        Returns:
+            instance of ArrayPattern class
+
+        """
+        if all(len(c) == 1 for c in alphabet_dict.values()):
+            words = _translate_words(self.words, alphabet_dict)
+        else:
+            words = np.array(["".join(alphabet_dict.get(c, c) for c in w)
+                              for w in self.pat_list], dtype=str)
+        return self._merge_words(words)
+
+    def merge_revcomp(self):
+        """Merge together DNA k-mers with their reverse complement words
+        (see `Pattern.merge_revcomp`).
+
+        Returns:
+            instance of ArrayPattern class
+
+        """
+        revwords = _reverse_words(_translate_words(self.words, COMPLEMENT))
+        return self._merge_words(np.where(revwords < self.words,
+                                          revwords, self.words))
+
+
+def _kmer_encoding(seq_list, k, canonical=False, alphabet_dict=None):
+    """Return integer encoding of characters of sequences if words of
+    size k can be encoded as 64-bit integers, otherwise None.
+
+    Args:
+        seq_list (list) : list of sequences
+        k (int) : word size
+        canonical (bool) : encode complements of characters as well
+        alphabet_dict (dict) : translation of sequence characters to
+            single characters of a reduced alphabet, applied before
+            encoding (see `Pattern.reduce_alphabet`)
+
+    Returns:
+        (alphabet, table, complement) tuple, where `alphabet` is
+        a sorted list of (translated) characters, `table` maps byte
+        values of sequence characters to indices in `alphabet`,
+        and `complement` maps each index to the index of its
+        complement (None unless `canonical`)
+
+    """
+    if k < 1:
+        return None
+    chars = set().union(*seq_list)
+    if any(ord(c) > 255 for c in chars):
+        return None
+    translation = {c: c for c in chars}
+    if alphabet_dict:
+        if any(len(alphabet_dict[c]) != 1 for c in chars
+               if c in alphabet_dict):
+            return None
+        translation.update((c, alphabet_dict[c]) for c in chars
+                           if c in alphabet_dict)
+    alphabet = set(translation.values())
+    if canonical:
+        alphabet.update([COMPLEMENT.get(c, c) for c in alphabet])
+    alphabet = sorted(alphabet)
+    if max(len(alphabet), 2) ** k > np.iinfo(np.int64).max:
+        return None
+    index = {c: i for i, c in enumerate(alphabet)}
+    table = np.zeros(256, dtype=np.int64)
+    for c, rc in translation.items():
+        table[ord(c)] = index[rc]
+    complement = None
+    if canonical:
+        complement = np.array([index[COMPLEMENT.get(c, c)]
+                               for c in alphabet], dtype=np.int64)
+    return alphabet, table, complement
+
+
+def _iter_seq_chunks(seq_list, chunk_size=COUNT_CHUNK_SIZE):
+    """Iterate over consecutive sequences holding together
+    at most `chunk_size` characters (or a single longer sequence).
+
+    Yields:
+        (seqidx, seqs) tuple: index of the first sequence and a list
+        of sequences
+
+    """
+    start = 0
+    size = 0
+    for seqidx, seq in enumerate(seq_list):
+        if size and size + len(seq) > chunk_size:
+            yield start, seq_list[start:seqidx]
+            start = seqidx
+            size = 0
+        size += len(seq)
+    if start < len(seq_list):
+        yield start, seq_list[start:]
+
+
+def _rolling_codes(chars, k, base):
+    """Return integer codes of all words of size k.
+
+    Codes of words of sizes being powers of two are built by doubling
+    and combined according to the binary representation of k, so that
+    only O(log k) array operations are needed.
+
+    Args:
+        chars (ndarray): indices of characters in alphabet (int64),
+            at least k elements
+        k (int): word size
+        base (int): alphabet size
+
+    Returns:
+        ndarray of len(chars) - k + 1 codes
+
+    """
+    n = len(chars)
+    codes = None
+    size = 0
+    power = chars
+    power_size = 1
+    while True:
+        if k & 1:
+            if codes is None:
+                codes = power.copy()
+                size = power_size
+            else:
+                m = n - size - power_size + 1
+                codes = codes[:m]
+                codes *= base ** power_size
+                codes += power[size:size + m]
+                size += power_size
+        k >>= 1
+        if not k:
+            return codes
+        power = (power[:len(power) - power_size] * base ** power_size +
+                 power[power_size:])
+        power_size *= 2
+
+
+def _count_kmer_codes(codes, seqidx, pos, space, seq_count):
+    """Count occurrences of word codes in sequences.
+
+    Args:
+        codes (ndarray): word codes of windows ordered by sequence
+        seqidx (ndarray): sequence index of each window
+        pos (ndarray): position of each window
+        space (int): number of possible word codes
+        seq_count (int): number of sequences
+
+    Returns:
+        (codes, seqidx, counts, firsts) tuple of arrays for distinct
+        (code, seqidx) pairs sorted by sequence index and code, where
+        `firsts` is a position of the first occurrence of the code in
+        the sequence (or in any of the sequences).
+
+    """
+    if space * seq_count <= max(2 * len(codes), 2**16):
+        # Few possible words: count them directly in a dense table.
+        counts = np.bincount(seqidx * space + codes,
+                             minlength=space * seq_count)
+        keys = np.flatnonzero(counts)
+        first_pos = np.full(space, np.iinfo(np.int64).max)
+        np.minimum.at(first_pos, codes, pos)
+        return (keys % space, keys // space, counts[keys],
+                first_pos[keys % space])
+    # A stable sort groups occurrences of a word in a sequence,
+    # the first occurrence being the first element of a group.
+    if space * seq_count <= np.iinfo(np.int64).max:
+        order = np.argsort(seqidx * space + codes, kind='stable')
+    else:
+        order = np.lexsort((codes, seqidx))
+    codes = codes[order]
+    seqidx = seqidx[order]
+    pos = pos[order]
+    new = np.ones(len(codes), dtype=bool)
+    new[1:] = (codes[1:] != codes[:-1]) | (seqidx[1:] != seqidx[:-1])
+    first = np.flatnonzero(new)
+    counts = np.diff(np.append(first, len(codes)))
+    return codes[first], seqidx[first], counts, pos[first]
+
+
+def _seq_chunk_codes(seqs, word_sizes, table, base, complement=None):
+    """Encode words of given sizes in a chunk of sequences.
+
+    Codes are computed once for the largest word size; codes of shorter
+    words are their prefixes (integer division by a power of the base).
+    If `complement` is given, each word is encoded as the lesser of its
+    code and the code of its reverse complement, computed from the
+    reverse complemented chunk.
+
+    Returns:
+        list of (codes, seqidx, pos) tuples of arrays, one per word
+        size, holding codes, sequence indices and positions (relative
+        to the chunk) of all words in order of their positions,
+        or None where the chunk has no words
+
+    """
+    lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+    chars = table[np.frombuffer("".join(seqs).encode('latin-1'),
+                                dtype=np.uint8)]
+    n = len(chars)
+    k = max(word_sizes)
+    if n < min(word_sizes):
+        return [None] * len(word_sizes)
+    # Padding gives words of size k at the end of the chunk, so that
+    # all shorter words are their prefixes.
+    padding = np.zeros(k - 1, dtype=np.int64)
+    codes = _rolling_codes(np.append(chars, padding), k, base)
+    if complement is not None:
+        revcodes = _rolling_codes(
+            np.append(complement[chars[::-1]], padding), k, base)
+    seqidx = np.repeat(np.arange(len(seqs)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    pos = np.arange(n)
+    result = []
+    for size in word_sizes:
+        nwin = n - size + 1
+        if nwin <= 0:
+            result.append(None)
+            continue
+        # Skip windows spanning two sequences.
+        valid = pos[:nwin] - starts[seqidx[:nwin]] <= \
+            lengths[seqidx[:nwin]] - size
+        size_codes = codes[:nwin] // base ** (k - size)
+        if complement is not None:
+            # Window i of the chunk is reverse complemented by window
+            # n - size - i of the reverse complemented chunk.
+            size_codes = np.minimum(
+                size_codes, revcodes[:nwin][::-1] // base ** (k - size))
+        result.append((size_codes[valid], seqidx[:nwin][valid],
+                       pos[:nwin][valid]))
+    return result
+
+
+def _count_seq_chunk(seqs, word_sizes, table, base, complement=None):
+    """Count words of given sizes in a chunk of sequences
+    (see `_count_kmers` and `_seq_chunk_codes`).
+
+    Returns:
+        list of (codes, seqidx, counts, firsts) tuples of arrays for
+        distinct (code, seqidx) pairs (see `_count_kmer_codes`), one per
+        word size, with sequence indices and positions relative to the
+        chunk, or None where the chunk has no words
+
+    """
+    result = []
+    for size, words in zip(word_sizes, _seq_chunk_codes(
+            seqs, word_sizes, table, base, complement)):
+        if words is not None:
+            words = _count_kmer_codes(*words, space=base ** size,
+                                      seq_count=len(seqs))
+        result.append(words)
+    return result
+
+
+_worker_seqs = None
+
+
+def _init_worker(seq_list):
+    global _worker_seqs
+    _worker_seqs = seq_list
+
+
+def _count_seq_chunk_worker(task):
+    start, stop, word_sizes, table, base, complement = task
+    return _count_seq_chunk(_worker_seqs[start:stop], word_sizes, table,
+                            base, complement)
+
+
+def _create_pool(seq_list, workers):
+    """Create a pool of worker processes sharing a list of sequences.
+
+    Where possible, workers are forked, so that they share sequences
+    with the parent process through copy-on-write memory instead of
+    receiving pickled copies.
+
+    """
+    import multiprocessing
+    try:
+        context = multiprocessing.get_context('fork')
+    except ValueError:
+        # Platforms without fork: pickle sequences to each worker.
+        return multiprocessing.Pool(workers, _init_worker, (seq_list,))
+    _init_worker(seq_list)
+    return context.Pool(workers)
+
+
+def _iter_chunk_counts(seq_list, word_sizes, table, base, complement=None,
+                       workers=1):
+    """Count words in consecutive chunks of sequences, serially or in
+    a pool of `workers` processes.
+
+    Yields:
+        (seq_offset, char_offset, pairs) tuple: index of the first
+        sequence and of its first character, and result of
+        `_count_seq_chunk` for a chunk
+
+    """
+    chunk_size = COUNT_CHUNK_SIZE
+    if workers > 1:
+        # Several chunks per worker balance the load.
+        total = sum(len(seq) for seq in seq_list)
+        chunk_size = min(chunk_size, max(total // (4 * workers), 1))
+    tasks = []
+    char_offset = 0
+    for seq_offset, seqs in _iter_seq_chunks(seq_list, chunk_size):
+        tasks.append((seq_offset, char_offset, len(seqs)))
+        char_offset += sum(len(seq) for seq in seqs)
+    if workers > 1 and len(tasks) > 1:
+        global _worker_seqs
+        pool = _create_pool(seq_list, workers)
+        try:
+            results = pool.imap(_count_seq_chunk_worker,
+                                [(start, start + size, word_sizes,
+                                  table, base, complement)
+                                 for start, _, size in tasks])
+            for (seq_offset, char_offset, _), pairs in zip(tasks, results):
+                yield seq_offset, char_offset, pairs
+        finally:
+            pool.close()
+            pool.join()
+            _worker_seqs = None
+    else:
+        for seq_offset, char_offset, size in tasks:
+            seqs = seq_list[seq_offset:seq_offset + size]
+            yield seq_offset, char_offset, _count_seq_chunk(
+                seqs, word_sizes, table, base, complement)
+
+
+def _count_kmers(seq_list, word_sizes, table, base, complement=None,
+                 workers=1):
+    """Count words of given sizes in sequences using integer-encoded
+    k-mers.
+
+    Each character is mapped to its index in an alphabet by `table`
+    (see `_kmer_encoding`), and each word to an integer: its characters
+    read as digits in `base` (size of the alphabet).
+    Word codes are computed for all positions with vectorized rolling
+    arithmetic and counted by sorting, chunk by chunk of sequences.
+    Chunks may be counted in parallel by `workers` processes; their
+    counts are then merged into a single set of distinct words.
+    All word sizes are counted in a single pass over sequences.
+    If `complement` is given, words are merged with their reverse
+    complements as they are counted (see `_count_seq_chunk`).
+
+    Returns:
+        list of (codes, word_idx, seq_idx, counts) tuples of arrays,
+        one per word size, where `codes` are codes of distinct words
+        ordered by their first occurrence in sequences, and
+        (word_idx, seq_idx, counts) hold the number of occurrences of
+        a word (index in `codes`) in a sequence, sorted by word index
+        and sequence index.
+
+    """
+    pairs_list = [([], [], [], []) for _ in word_sizes]
+    for seq_offset, char_offset, chunk_pairs in _iter_chunk_counts(
+            seq_list, word_sizes, table, base, complement, workers):
+        for pairs, lists in zip(chunk_pairs, pairs_list):
+            if pairs is not None:
+                codes, seqidx, counts, firsts = pairs
+                lists[0].append(codes)
+                lists[1].append(seqidx + seq_offset)
+                lists[2].append(counts)
+                lists[3].append(firsts + char_offset)
+    result = []
+    for pair_codes, pair_seqs, pair_counts, pair_firsts in pairs_list:
+        if not pair_codes:
+            empty = np.zeros(0, dtype=np.int64)
+            result.append((empty, empty, empty, empty))
+            continue
+        # Sequences do not span chunks, so (code, seqidx) pairs are
+        # unique and ordered by sequence.
+        result.append(_group_kmer_pairs(np.concatenate(pair_codes),
+                                        np.concatenate(pair_seqs),
+                                        np.concatenate(pair_counts),
+                                        np.concatenate(pair_firsts)))
+    return result
+
+
+def _group_kmer_pairs(codes, seqidx, counts, firsts):
+    """Group counts of distinct (code, seqidx) pairs by word.
+
+    Args:
+        codes, seqidx, counts, firsts (ndarray): word codes, sequence
+            indices, numbers of occurrences and positions of the first
+            occurrence of distinct (code, seqidx) pairs ordered by
+            sequence index within each code
+
+    Returns:
+        (codes, word_idx, seq_idx, counts) tuple of arrays
+        (see `_count_kmers`)
+
+    """
+    # A stable sort groups pairs by word.
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    seqidx = seqidx[order]
+    counts = counts[order]
+    firsts = firsts[order]
+    new = np.ones(len(codes), dtype=bool)
+    new[1:] = codes[1:] != codes[:-1]
+    bounds = np.flatnonzero(new)
+    sizes = np.diff(np.append(bounds, len(codes)))
+    # Rank distinct words by their first occurrence and reorder
+    # groups of pairs accordingly.
+    word_order = np.argsort(np.minimum.reduceat(firsts, bounds),
+                            kind='stable')
+    sizes = sizes[word_order]
+    offsets = np.cumsum(sizes) - sizes
+    order = (np.repeat(bounds[word_order] - offsets, sizes) +
+             np.arange(len(codes)))
+    word_idx = np.repeat(np.arange(len(sizes)), sizes)
+    return codes[bounds][word_order], word_idx, seqidx[order], counts[order]
+
+
+def _decode_kmers(codes, k, alphabet):
+    """Return words (numpy unicode array) of integer-encoded k-mers."""
+    base = max(len(alphabet), 2)
+    digits = np.empty((len(codes), k), dtype=np.int64)
+    codes = codes.copy()
+    for j in range(k - 1, -1, -1):
+        digits[:, j] = codes % base
+        codes //= base
+    chars = np.array([ord(c) for c in alphabet], dtype=np.uint32)
+    words = np.ascontiguousarray(chars[digits])
+    return words.view('U{}'.format(k)).ravel()
+
+
+def _create_wordpattern(seq_list, k, workers=1, canonical=False,
+                        alphabet_dict=None):
     """Create a word pattern for a given list of sequences and word size.
 
     Since most of alignment-free distance-calculating algorithms ignore the
@@ -255,12 +893,23 @@ def _create_wordpattern(seq_list, k):
     position of words. Therefore, in a resulting Pattern object, the attribute
     `pos_list` is an empty list.
 
+    Words are counted with integer-encoded k-mers (see `_count_kmers`)
+    whenever they fit in 64-bit integers; the resulting pattern holds
+    the same words and counts as that created by counting word strings
+    one by one.
+
     Args:
         seq_list (list) : list of sequences
         k (int) : word size
+        workers (int) : number of processes counting chunks of
+                        sequences in parallel
+        canonical (bool) : count each DNA word together with its reverse
+                           complement (see `Pattern.merge_revcomp`)
+        alphabet_dict (dict) : count words in a reduced alphabet
+                               (see `Pattern.reduce_alphabet`)
 
     Returns:
-        instance of Pattern
+        instance of ArrayPattern
 
     Examples:
         >>> seqs = ['ATGC', 'CGCG', 'GCAT']
@@ -280,6 +929,54 @@ def _create_wordpattern(seq_list, k):
         1   1   CA 2:1
 
     """
+    return _create_wordpatterns(seq_list, [k], workers, canonical,
+                                alphabet_dict)[0]
+
+
+def _create_wordpatterns(seq_list, word_sizes, workers=1, canonical=False,
+                         alphabet_dict=None):
+    """Create word patterns for a list of word sizes in a single pass
+    over sequences (see `_create_wordpattern`)."""
+    encoding = _kmer_encoding(seq_list, max(word_sizes), canonical,
+                              alphabet_dict)
+    if encoding is None or min(word_sizes) < 1:
+        patterns = [ArrayPattern.from_pattern(
+                    _create_wordpattern_strings(seq_list, k))
+                    for k in word_sizes]
+        if alphabet_dict:
+            patterns = [p.reduce_alphabet(alphabet_dict) for p in patterns]
+        if canonical:
+            patterns = [p.merge_revcomp() for p in patterns]
+        return patterns
+    alphabet, table, complement = encoding
+    base = max(len(alphabet), 2)
+    patterns = []
+    for k, (codes, word_idx, seq_idx, counts) in zip(
+            word_sizes, _count_kmers(seq_list, word_sizes, table, base,
+                                     complement, workers)):
+        indptr = np.searchsorted(word_idx, np.arange(len(codes) + 1))
+        patterns.append(ArrayPattern(_decode_kmers(codes, k, alphabet),
+                                     indptr, seq_idx, counts))
+    return patterns
+
+
+def _recode_kmers(codes, k, old_base, new_base):
+    """Convert integer-encoded k-mers to a different base."""
+    if old_base == new_base:
+        return codes
+    codes = codes.copy()
+    result = np.zeros(len(codes), dtype=np.int64)
+    scale = 1
+    for _ in range(k):
+        result += (codes % old_base) * scale
+        codes //= old_base
+        scale *= new_base
+    return result
+
+
+def _create_wordpattern_strings(seq_list, k):
+    """Create a word pattern by counting word strings one by one
+    (see `_create_wordpattern`)."""
     d = {}
     for seqidx, seq in enumerate(seq_list):
         for i in range(0, len(seq) - k + 1):
@@ -300,12 +997,16 @@ def _create_wordpattern_positions(seq_list, k):
     This function records position of words and the resulting Pattern object
     contains this information.
 
+    Words are encoded as integers (see `_count_kmers`) and sorted by code,
+    so that positions of each word in each sequence end up as consecutive,
+    ascending elements of a single array (`ArrayPattern.positions`).
+
     Args:
         seq_list (list) : list of sequences
         k (int) : word size
 
     Returns:
-        instance of Pattern
+        instance of ArrayPattern
 
     Examples:
         >>> seqs = ['ATGC', 'CGCG', 'GCAT']
@@ -325,6 +1026,43 @@ def _create_wordpattern_positions(seq_list, k):
         1   1   CA 2 1
 
     """
+    encoding = _kmer_encoding(seq_list, k)
+    if encoding is None:
+        return ArrayPattern.from_pattern(
+            _create_wordpattern_positions_strings(seq_list, k))
+    alphabet, table, _ = encoding
+    base = max(len(alphabet), 2)
+    empty = np.zeros(0, dtype=np.int64)
+    codes = [empty]
+    seqidx = [empty]
+    positions = [empty]
+    for seq_offset, seqs in _iter_seq_chunks(seq_list):
+        words = _seq_chunk_codes(seqs, [k], table, base)[0]
+        if words is not None:
+            lengths = np.array([len(seq) for seq in seqs], dtype=np.int64)
+            starts = np.cumsum(lengths) - lengths
+            chunk_codes, chunk_seqidx, pos = words
+            codes.append(chunk_codes)
+            seqidx.append(chunk_seqidx + seq_offset)
+            positions.append(pos - starts[chunk_seqidx])
+    codes = np.concatenate(codes)
+    # Every word occurrence is a (code, seqidx) pair of count 1; its
+    # position is carried along in place of the count.
+    codes, word_idx, seqidx, positions = _group_kmer_pairs(
+        codes, np.concatenate(seqidx), np.concatenate(positions),
+        np.arange(len(codes)))
+    new = np.ones(len(word_idx), dtype=bool)
+    new[1:] = (word_idx[1:] != word_idx[:-1]) | (seqidx[1:] != seqidx[:-1])
+    starts = np.flatnonzero(new)
+    counts = np.diff(np.append(starts, len(word_idx)))
+    indptr = np.searchsorted(word_idx[starts], np.arange(len(codes) + 1))
+    return ArrayPattern(_decode_kmers(codes, k, alphabet), indptr,
+                        seqidx[starts], counts, positions)
+
+
+def _create_wordpattern_positions_strings(seq_list, k):
+    """Create a full word pattern by recording positions of word strings
+    one by one (see `_create_wordpattern_positions`)."""
     d = {}
     d1 = {}
     for seqidx, seq in enumerate(seq_list):
@@ -344,7 +1082,8 @@ def _create_wordpattern_positions(seq_list, k):
     return Pattern(pat_list=pat_list, occr_list=occr_list, pos_list=pos_list)
 
 
-def create(seq_list, word_size=1, wordpos=False):
+def create(seq_list, word_size=1, wordpos=False, workers=1, canonical=False,
+           alphabet_dict=None):
     """Create a word pattern for a given list of sequences and word size.
 
     This function can either record or ignore position of words.
@@ -353,9 +1092,20 @@ def create(seq_list, word_size=1, wordpos=False):
         seq_list (list) : list of sequences
         k (int) : word size
         wordpos (bool) : record (True) or ignore (False) the word positions
+        workers (int) : number of processes counting words in parallel
+                        (word positions are always recorded serially)
+        canonical (bool) : count each DNA word together with its reverse
+                           complement, as the lesser of the two words
+                           (same as `Pattern.merge_revcomp`, which
+                           discards word positions)
+        alphabet_dict (dict) : translation of sequence characters to
+                               a reduced alphabet, in which words are
+                               counted (same as `Pattern.reduce_alphabet`,
+                               which discards word positions); applied
+                               before merging reverse complements
 
     Returns:
-        instance of Pattern
+        instance of Pattern (ArrayPattern if word positions are ignored)
 
     Examples:
         >>> seqs = ['ATGC', 'CGCG', 'GCAT']
@@ -373,42 +1123,242 @@ def create(seq_list, word_size=1, wordpos=False):
         2   2   T 0 1 2 3
         2   2   A 0 0 2 2
 
+        >>> p = create(seqs, 1, canonical=True)
+        >>> print(p)
+        8   3   C 0:2 1:4 2:2
+        4   2   A 0:2 2:2
+
+        >>> p = create(seqs, 2, alphabet_dict={'A': 'R', 'G': 'R',
+        ...                                    'C': 'Y', 'T': 'Y'})
+        >>> print(p)
+        5   3   RY 0:2 1:1 2:2
+        4   3   YR 0:1 1:2 2:1
+
     """
     if wordpos:
-        return _create_wordpattern_positions(seq_list, word_size)
-    return _create_wordpattern(seq_list, word_size)
+        p = _create_wordpattern_positions(seq_list, word_size)
+        if alphabet_dict:
+            p = p.reduce_alphabet(alphabet_dict)
+        return p.merge_revcomp() if canonical else p
+    return _create_wordpattern(seq_list, word_size, workers, canonical,
+                               alphabet_dict)
 
 
-def create_from_fasta(handle, word_size=1, wordpos=False):
+def create_multi(seq_list, word_sizes, workers=1, canonical=False,
+                 alphabet_dict=None):
+    """Create word patterns for several word sizes at once.
+
+    Sequences are scanned once: words of all sizes are derived from
+    integer codes of the longest words. Word positions are not recorded.
+
+    Args:
+        seq_list (list) : list of sequences
+        word_sizes (list) : list of word sizes
+        workers (int) : number of processes counting words in parallel
+        canonical (bool) : merge words with reverse complements
+                           (see `create`)
+        alphabet_dict (dict) : count words in a reduced alphabet
+                               (see `create`)
+
+    Returns:
+        list of ArrayPattern instances, one per word size (e.g. ready
+        for `word_d2.Distance` vectors or `word_vector.Composition`)
+
+    Examples:
+        >>> seqs = ['ATGC', 'CGCG', 'GCAT']
+        >>> p3, p2, p1 = create_multi(seqs, [3, 2, 1])
+        >>> print(p2)
+        3   3   GC 0:1 1:1 2:1
+        2   2   AT 0:1 2:1
+        2   1   CG 1:2
+        1   1   TG 0:1
+        1   1   CA 2:1
+
+    """
+    return _create_wordpatterns(seq_list, list(word_sizes), workers,
+                                canonical, alphabet_dict)
+
+
+def create_from_fasta(handle, word_size=1, wordpos=False, workers=1):
     """Create word patterns (Pattern object) from a FASTA file"""
     seq_records = seqrecords.read_fasta(handle)
-    return create(seq_records.seq_list, word_size=word_size, wordpos=wordpos)
+    return create(seq_records.seq_list, word_size=word_size, wordpos=wordpos,
+                  workers=workers)
+
+
+def _open_fasta(filename):
+    """Open a plain or gzip-compressed FASTA file in binary mode."""
+    fh = open(filename, 'rb')
+    magic = fh.read(2)
+    if magic == b'\x1f\x8b':
+        fh.close()
+        return gzip.open(filename, 'rb')
+    fh.seek(0)
+    return fh
+
+
+# Header lines and bytes ignored in sequence lines of FASTA files.
+_FASTA_HEADER = re.compile(br'^[ \t\r\v\f]*>[^\n]*', re.M)
+_WHITESPACE = b' \t\n\r\v\f'
+
 
+def _iter_fasta_blocks(fh, block_size=FASTA_BLOCK_SIZE):
+    """Read sequence characters of a FASTA file block by block.
 
-def create_from_bigfasta(filename, k=1):
-    """Create word patterns (Pattern object) from a big FASTA file.
+    Lines are never split between blocks.
 
-    This function does not read full-length sequences into memory, but rather
-    reads a file line by line. The function does not record word positions.
+    Yields:
+        (chars, recidx) tuple of arrays: sequence characters (uint8)
+        and index of the record (sequence) of each character
 
     """
-    fh = open(filename)
+    pending = b''
+    recidx = -1
+    while True:
+        data = fh.read(block_size)
+        buf = pending + data
+        if data:
+            cut = buf.rfind(b'\n') + 1
+            buf, pending = buf[:cut], buf[cut:]
+        parts = []
+        part_recs = []
+        start = 0
+        for match in _FASTA_HEADER.finditer(buf):
+            # Characters before the first header are skipped.
+            if recidx >= 0:
+                parts.append(buf[start:match.start()].translate(
+                    None, _WHITESPACE))
+                part_recs.append(recidx)
+            recidx += 1
+            start = match.end()
+        if recidx >= 0:
+            parts.append(buf[start:].translate(None, _WHITESPACE))
+            part_recs.append(recidx)
+        chars = np.frombuffer(b''.join(parts), dtype=np.uint8)
+        if len(chars):
+            yield chars, np.repeat(np.array(part_recs, dtype=np.int64),
+                                   [len(part) for part in parts])
+        if not data:
+            break
+
+
+def create_from_bigfasta(filename, k=1, block_size=FASTA_BLOCK_SIZE):
+    """Create word patterns (ArrayPattern object) from a big FASTA file.
+
+    This function does not read full-length sequences into memory, but
+    rather reads a (plain or gzip-compressed) file in blocks of
+    `block_size` bytes and counts integer-encoded k-mers of each block
+    with vectorized operations. The last k-1 characters of a block are
+    carried over to the next one, so that words spanning block and line
+    boundaries are counted. The function does not record word positions.
+
+    """
+    if k < 1:
+        return ArrayPattern.from_pattern(
+            _create_from_bigfasta_strings(filename, k))
+    fh = _open_fasta(filename)
+    table = np.full(256, -1, dtype=np.int64)
+    alphabet = []
+    base = 2
+    tail_chars = np.zeros(0, dtype=np.int64)
+    tail_recs = np.zeros(0, dtype=np.int64)
+    char_offset = 0
+    pair_codes = []
+    pair_seqs = []
+    pair_counts = []
+    pair_firsts = []
+    for block_chars, block_recs in _iter_fasta_blocks(fh, block_size):
+        present = np.flatnonzero(np.bincount(block_chars, minlength=256))
+        new_chars = present[table[present] < 0]
+        if len(new_chars):
+            # Extend the alphabet and re-encode words counted so far.
+            table[new_chars] = np.arange(len(alphabet),
+                                         len(alphabet) + len(new_chars))
+            alphabet.extend(chr(c) for c in new_chars)
+            new_base = max(len(alphabet), 2)
+            if new_base ** k > np.iinfo(np.int64).max:
+                fh.close()
+                return ArrayPattern.from_pattern(
+                    _create_from_bigfasta_strings(filename, k))
+            pair_codes = [_recode_kmers(codes, k, base, new_base)
+                          for codes in pair_codes]
+            base = new_base
+        chars = np.concatenate((tail_chars, table[block_chars]))
+        recs = np.concatenate((tail_recs, block_recs))
+        nwin = len(chars) - k + 1
+        if nwin > 0:
+            codes = _rolling_codes(chars, k, base)
+            first_rec = recs[0]
+            pos = np.arange(nwin) + (char_offset - len(tail_chars))
+            seqidx = recs[:nwin] - first_rec
+            if recs[-1] != first_rec:
+                # Skip windows spanning two records.
+                valid = recs[:nwin] == recs[k - 1:]
+                codes = codes[valid]
+                seqidx = seqidx[valid]
+                pos = pos[valid]
+            codes, seqidx, counts, firsts = _count_kmer_codes(
+                codes, seqidx, pos, base ** k, int(recs[-1] - first_rec) + 1)
+            pair_codes.append(codes)
+            pair_seqs.append(seqidx + first_rec)
+            pair_counts.append(counts)
+            pair_firsts.append(firsts)
+        char_offset += len(block_chars)
+        tail_chars = chars[len(chars) - min(k - 1, len(chars)):]
+        tail_recs = recs[len(recs) - min(k - 1, len(recs)):]
+    fh.close()
+    if not pair_codes:
+        return ArrayPattern([], [0], [], [])
+    codes = np.concatenate(pair_codes)
+    del pair_codes[:]
+    seqidx = np.concatenate(pair_seqs)
+    del pair_seqs[:]
+    # Records spanning blocks give repeated (code, seqidx) pairs.
+    record_count = int(seqidx[-1]) + 1 if len(seqidx) else 1
+    if (base ** k) * record_count <= np.iinfo(np.int64).max:
+        order = np.argsort(codes * record_count + seqidx)
+    else:
+        order = np.lexsort((seqidx, codes))
+    codes = codes[order]
+    seqidx = seqidx[order]
+    new = np.ones(len(codes), dtype=bool)
+    new[1:] = (codes[1:] != codes[:-1]) | (seqidx[1:] != seqidx[:-1])
+    bounds = np.flatnonzero(new)
+    del new
+    codes = codes[bounds]
+    seqidx = seqidx[bounds]
+    counts = np.add.reduceat(np.concatenate(pair_counts)[order], bounds)
+    del pair_counts[:]
+    firsts = np.minimum.reduceat(np.concatenate(pair_firsts)[order], bounds)
+    del pair_firsts[:], order, bounds
+    codes, word_idx, seq_idx, counts = _group_kmer_pairs(codes, seqidx,
+                                                         counts, firsts)
+    indptr = np.searchsorted(word_idx, np.arange(len(codes) + 1))
+    return ArrayPattern(_decode_kmers(codes, k, alphabet), indptr,
+                        seq_idx, counts)
+
+
+def _create_from_bigfasta_strings(filename, k):
+    """Create word patterns from a big FASTA file by counting word
+    strings one by one (see `create_from_bigfasta`)."""
+    fh = _open_fasta(filename)
     d = {}
     pat_list = []
     pos_list = []
-    len_list = []
 
     word_idx = -1
     seqnum = -1
+    word = []
+    word_size = 0
 
     for line in fh:
-        line = line.strip()
+        line = line.decode('latin-1').strip()
         if line.startswith('>'):
             word = []
             word_size = 0
             seqnum += 1
-        else:
-            for char in line:
+        elif seqnum >= 0:
+            for char in "".join(line.split()):
                 word.append(char)
                 word_size += 1
                 if word_size == k:
@@ -416,7 +1366,6 @@ def create_from_bigfasta(filename, k=1):
                     if w not in d:
                         pat_list.append(w)
                         pos_list.append({})
-                        len_list.append(len(w))
                         word_idx += 1
                         d[w] = word_idx
                     if seqnum not in pos_list[d[w]]:
@@ -471,12 +1420,15 @@ def read(handle):
     """Read word patterns (as a Pattern object) from a file.
 
     This function autodetects whether the patterns are written either as
-    teiresias or alfree format.
+    teiresias or alfree format, or in binary format (see `write_binary`).
+    Arrays of binary patterns are memory-mapped rather than parsed.
 
     Returns
-        Pattern object.
+        Pattern object (ArrayPattern if the format is binary).
 
     """
+    if _is_binary(handle):
+        return _read_binary(handle)
     fh = handle
     pat_list = []
     pos_list = []
@@ -504,6 +1456,104 @@ def read(handle):
     return Pattern(pat_list=pat_list, pos_list=pos_list, occr_list=occr_list)
 
 
+def _binary_handle(handle):
+    """Return a binary stream underlying a file opened in text mode."""
+    if isinstance(handle, io.TextIOBase):
+        handle.flush()
+        return handle.buffer
+    return handle
+
+
+def _is_binary(handle):
+    """Check whether a file handle (at its start) holds a word pattern
+    in binary format, without consuming any data."""
+    fh = getattr(handle, 'buffer', handle)
+    if not hasattr(fh, 'peek'):
+        return False
+    return fh.peek(len(PATTERN_MAGIC))[:len(PATTERN_MAGIC)] == PATTERN_MAGIC
+
+
+def write_binary(handle, pattern):
+    """Write a word pattern to a file in binary format.
+
+    File layout:
+        - PATTERN_MAGIC bytes
+        - header length (4-byte little-endian unsigned int)
+        - header: JSON object with `dtype`, `shape` and `offset` (from
+          the end of the header) of each array, padded with spaces to
+          align the data following the header to 64 bytes
+        - arrays of `ArrayPattern` attributes (`words`, `indptr`,
+          `seq_idx`, `counts` and optional `positions`) in little-endian
+          byte order, each aligned to 64 bytes
+
+    Arrays can be memory-mapped by `read` instead of being parsed.
+
+    Args:
+        handle (file) : file opened for writing (in text or binary mode)
+        pattern (Pattern) : word pattern
+
+    """
+    if not isinstance(pattern, ArrayPattern):
+        pattern = ArrayPattern.from_pattern(pattern)
+    arrays = [('words', pattern.words), ('indptr', pattern.indptr),
+              ('seq_idx', pattern.seq_idx), ('counts', pattern.counts)]
+    if pattern.positions is not None:
+        arrays.append(('positions', pattern.positions))
+    header = {}
+    chunks = []
+    offset = 0
+    for name, array in arrays:
+        array = np.ascontiguousarray(
+            array, dtype=array.dtype.newbyteorder('<'))
+        header[name] = {'dtype': array.dtype.str,
+                        'shape': list(array.shape),
+                        'offset': offset}
+        padding = b'\0' * (-array.nbytes % 64)
+        chunks.extend([array, padding])
+        offset += array.nbytes + len(padding)
+    header = json.dumps(header).encode('utf-8')
+    header += b' ' * (-(len(PATTERN_MAGIC) + 4 + len(header)) % 64)
+    fh = _binary_handle(handle)
+    fh.write(PATTERN_MAGIC + struct.pack('<I', len(header)) + header)
+    for chunk in chunks:
+        fh.write(memoryview(chunk).cast('B') if len(chunk) else b'')
+    fh.flush()
+
+
+def _read_binary(handle):
+    """Read a word pattern in binary format (see `write_binary`).
+
+    Arrays of a regular file are memory-mapped; those of other streams
+    (e.g. pipes) are read into memory.
+
+    """
+    fh = getattr(handle, 'buffer', handle)
+    fh.read(len(PATTERN_MAGIC))
+    header_len = struct.unpack('<I', fh.read(4))[0]
+    header = json.loads(fh.read(header_len).decode('utf-8'))
+    start = len(PATTERN_MAGIC) + 4 + header_len
+    filename = getattr(handle, 'name', None)
+    if isinstance(filename, str) and os.path.isfile(filename):
+        def load(meta):
+            shape = tuple(meta['shape'])
+            if not shape[0]:
+                return np.zeros(shape, dtype=meta['dtype'])
+            return np.memmap(filename, dtype=meta['dtype'], mode='r',
+                             offset=start + meta['offset'], shape=shape)
+    else:
+        data = fh.read()
+
+        def load(meta):
+            dtype = np.dtype(meta['dtype'])
+            return np.frombuffer(data, dtype=dtype,
+                                 count=int(np.prod(meta['shape'])),
+                                 offset=meta['offset'])
+    arrays = {name: load(meta) for name, meta in header.items()}
+    return ArrayPattern(arrays['words'], arrays['indptr'],
+                        arrays['seq_idx'], arrays['counts'],
+                        arrays.get('positions'))
+
+
 def main():
     from .utils import seqrecords
     from .utils.data import seqcontent
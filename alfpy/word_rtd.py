@@ -18,6 +18,7 @@ References:
 """
 
 import numpy as np
+from . import word_pattern
 from .utils import distance
 
 
@@ -54,6 +55,12 @@ def calc_rtd(word_positions):
 def create_vector(seqcount, pattern):
     """Compute a matrix of sequence-representing RTD vectors
 
+    Return times of all words in all sequences are computed at once
+    from the array of word positions (`ArrayPattern.positions`), in which
+    positions of a word in a sequence are consecutive and ascending; mean
+    and standard deviation (as in `calc_rtd`) are segmented sums over
+    the return times of each (word, sequence) pair.
+
     Args:
         seqcount (int): number of sequences
         pattern (obj: word_pattern.Pattern)
@@ -63,14 +70,24 @@ def create_vector(seqcount, pattern):
                  (shape: number of seqs, doubled number of words)
 
     """
-    words = pattern.pat_list
-    data = np.zeros(shape=(seqcount, len(words) * 2))
-    for wordidx in range(len(words)):
-        for seqidx in pattern.pos_list[wordidx]:
-            word_positions = pattern.pos_list[wordidx][seqidx]
-            mean, std = calc_rtd(word_positions)
-            data[seqidx, wordidx * 2] = mean
-            data[seqidx, wordidx * 2 + 1] = std
+    if getattr(pattern, 'positions', None) is None:
+        pattern = word_pattern.ArrayPattern.from_pattern(pattern)
+    data = np.zeros(shape=(seqcount, pattern.count * 2))
+    counts = pattern.counts.astype(np.int64)
+    pairs = len(counts)
+    # Return times between successive positions of the same pair.
+    pair_idx = np.repeat(np.arange(pairs), counts)
+    same = pair_idx[1:] == pair_idx[:-1]
+    times = np.diff(pattern.positions.astype(np.int64))[same]
+    pair_idx = pair_idx[1:][same]
+    rt_counts = np.maximum(counts - 1, 1)
+    mean = np.bincount(pair_idx, weights=times, minlength=pairs) / rt_counts
+    var = np.bincount(pair_idx, weights=(times - mean[pair_idx]) ** 2,
+                      minlength=pairs) / rt_counts
+    word_idx = pattern.word_idx
+    seq_idx = pattern.seq_idx
+    data[seq_idx, word_idx * 2] = mean
+    data[seq_idx, word_idx * 2 + 1] = np.sqrt(var)
     return data
 
 
@@ -11,8 +11,11 @@ originally published in:
 
 '''
 
-import math
 import numpy as np
+import weakref
+
+from . import word_pattern
+from .utils import sparse as _sparse
 
 
 class Counts:
@@ -24,37 +27,84 @@ class Counts:
         pat_list (list)       : List of words
         patlen (int)          : Length of words
         data (numpy.ndarray)  : Array of counts (cols) for each sequence (rows)
+                                (utils.sparse.CSRMatrix if sparse)
 
     """
 
-    def __init__(self, seq_lengths, patterns):
+    def __init__(self, seq_lengths, patterns, sparse=False):
         """Create Counts object.
 
         Args:
             seq_lengths (list)  : List of sequence lengths
             pattern (obj: word_pattern.Pattern)
+            sparse (bool)       : store only nonzero counts of each
+                                  sequence (CSR rows) instead of
+                                  a dense array
 
         """
         self.seq_lengths = seq_lengths
         self.pat_list = patterns.pat_list
         self.patlen = len(patterns.pat_list[0])
-        self.data = self._get_counts_occurrence(len(seq_lengths), patterns)
+        if sparse:
+            self.data = self._get_counts_sparse(len(seq_lengths), patterns)
+        else:
+            self.data = self._get_counts_occurrence(len(seq_lengths),
+                                                    patterns)
 
     @staticmethod
-    def _get_counts_occurrence(seq_count, patterns):
+    def _get_occurrences(seq_count, patterns):
+        """Return sequence indices, word indices and counts (arrays)
+        of word occurrences in the first `seq_count` sequences.
+
+        Occurrences are taken directly from an ArrayPattern or gathered
+        once from `occr_list` dicts of a Pattern.
+        """
+        if isinstance(patterns, word_pattern.ArrayPattern):
+            seq_idx = patterns.seq_idx
+            word_idx = patterns.word_idx
+            counts = patterns.counts
+        else:
+            lengths = [len(occr) for occr in patterns.occr_list]
+            word_idx = np.repeat(np.arange(patterns.count), lengths)
+            seq_idx = np.fromiter((seqidx for occr in patterns.occr_list
+                                   for seqidx in occr), dtype=np.int64,
+                                  count=len(word_idx))
+            counts = np.fromiter((count for occr in patterns.occr_list
+                                  for count in occr.values()),
+                                 dtype=np.int64, count=len(word_idx))
+        # Pattern may describe more sequences than given.
+        if len(seq_idx) and seq_idx.max() >= seq_count:
+            mask = seq_idx < seq_count
+            return seq_idx[mask], word_idx[mask], counts[mask]
+        return seq_idx, word_idx, counts
+
+    @classmethod
+    def _get_counts_sparse(cls, seq_count, patterns):
+        """Create a sparse (CSR) matrix of word counts for sequences.
+
+        Args:
+            seq_count (int)  : number of sequences
+            pattern (obj: word_pattern.Pattern)
+
+        """
+        seq_idx, word_idx, counts = cls._get_occurrences(seq_count, patterns)
+        return _sparse.CSRMatrix.from_coo(seq_idx, word_idx, counts,
+                                          (seq_count, patterns.count))
+
+    @classmethod
+    def _get_counts_occurrence(cls, seq_count, patterns):
         """Create a matrix of word counts for sequences.
 
+        Only nonzero counts are scattered into a zero-filled matrix.
+
         Args:
             seq_count (int)  : number of sequences
             pattern (obj: word_pattern.Pattern)
 
         """
-        data = np.empty((seq_count, patterns.count))
-        for seqidx in range(seq_count):
-            for patidx in range(patterns.count):
-                occr_dict = patterns.occr_list[patidx]
-                count = occr_dict.get(seqidx, 0)
-                data[seqidx, patidx] = count
+        seq_idx, word_idx, counts = cls._get_occurrences(seq_count, patterns)
+        data = np.zeros((seq_count, patterns.count))
+        data[seq_idx, word_idx] = counts
         return data
 
     def __getitem__(self, seqidx):
@@ -91,20 +141,23 @@ class Counts:
 class Bools(Counts):
     """Store word occurrences in sequences as Booleans (True / False)."""
 
-    def __init__(self, seq_lengths, patterns):
-        Counts.__init__(self, seq_lengths, patterns)
+    def __init__(self, seq_lengths, patterns, sparse=False):
+        Counts.__init__(self, seq_lengths, patterns, sparse)
         self.data = self.data.astype(bool)  # ndarray of bools.
 
 
 class Freqs(Counts):
     """Store word frequencies in sequences."""
 
-    def __init__(self, seq_lengths, patterns):
-        Counts.__init__(self, seq_lengths, patterns)
+    def __init__(self, seq_lengths, patterns, sparse=False):
+        Counts.__init__(self, seq_lengths, patterns, sparse)
         self.data = self.__relative_freqs()  # Calculate freqs from counts.
 
     def __relative_freqs(self):
         """Calculates word frequencies."""
+        if isinstance(self.data, _sparse.CSRMatrix):
+            totals = np.asarray(self.seq_lengths) - self.patlen + 1
+            return self.data / totals[:, np.newaxis]
         for seqidx in range(self.data.shape[0]):
             seqlen = self.seq_lengths[seqidx]
             counts = self.data[seqidx]
@@ -131,65 +184,81 @@ class FreqsStd(Freqs):
         Freqs.__init__(self, seq_lengths, patterns)
         self.data = self.__standardize_freqs(freqmodel)
 
-    def __overlaps(self, freqmodel):
-        result = []
-        for pattern in self.pat_list:
-            # assumption: all occurrences point to same pattern
-            overlap = freqmodel.overlap_capability(pattern)
-            result.append(overlap)
-        return result
-
     def __standardize_freqs(self, freqmodel):
-        overlaps = self.__overlaps(freqmodel)
-        for seqidx in range(self.data.shape[0]):
-            freqs = self.data[seqidx]
-            seqlen = self.seq_lengths[seqidx]
-            for pidx, pat in enumerate(self.pat_list):
-                freq = freqs[pidx]
-                overlap = overlaps[pidx]
-                var = freqmodel.var(pat, seqlen, self.patlen, overlap)
-                self.data[seqidx, pidx] = freq / math.sqrt(var)
-        return self.data
+        # assumption: all words are of the same length
+        var = freqmodel.var_matrix(self.pat_list, self.seq_lengths)
+        return self.data / np.sqrt(var)
 
 
 class WeightModel:
-    """Weighting model for words."""
+    """Weighting model for words.
+
+    A weight model `wtype` is a method `weights_<wtype>(words)` returning
+    an array of weights of words; new models are added by subclassing
+    and defining such a method. Weights of a pattern are computed once
+    per pattern and weight table, and reused by all vectors weighted
+    with the model.
+
+    """
 
     def __init__(self, char_weights, wtype='content'):
         self.char_weights = char_weights
         try:
 
-            func = getattr(self, wtype)
-            self.compute = func
+            self.word_weights = getattr(self, 'weights_{}'.format(wtype))
         # method does not exist
         except AttributeError:
             msg = 'unknown weight model "%s"' % wtype
             raise ValueError(msg)
+        self._cache = weakref.WeakKeyDictionary()
+
+    def weights(self, patterns):
+        """Return weights of words of a pattern (cached)."""
+        table = tuple(sorted(self.char_weights.items()))
+        cached = self._cache.get(patterns)
+        if cached is None or cached[0] != table:
+            words = getattr(patterns, 'words', patterns.pat_list)
+            cached = (table, self.word_weights(words))
+            self._cache[patterns] = cached
+        return cached[1]
+
+    def compute(self, vector, patterns):
+        """Multiply word occurrences (columns of `vector`) by word
+        weights."""
+        return vector * self.weights(patterns)
 
     def content(self, vector, patterns):
-        l = []
-        for pat in patterns.pat_list:
-            value = 1.0
-            for symbol in pat:
-                value *= self.char_weights.get(symbol, 1.0)
-            l.append(value)
-        l = np.array(l)
-        return vector * l
+        return vector * self.weights_content(
+            getattr(patterns, 'words', patterns.pat_list))
+
+    def weights_content(self, words):
+        """Weight of a word is the product of weights of its characters
+        (1.0 for characters without weight)."""
+        words = np.asarray(words, dtype=str)
+        if not len(words) or not words.dtype.itemsize:
+            return np.ones(len(words))
+        chars = np.ascontiguousarray(words).view(np.uint32).reshape(
+            len(words), -1)
+        uniq, inverse = np.unique(chars, return_inverse=True)
+        # Zeros pad words shorter than the longest word.
+        char_weights = np.array([self.char_weights.get(chr(c), 1.0) if c
+                                 else 1.0 for c in uniq.tolist()])
+        return np.prod(char_weights[inverse.reshape(chars.shape)], axis=1)
 
 
 class CountsWeight(Counts):
     """Store weighted counts according to a given weight model."""
 
-    def __init__(self, seq_lengths, patterns, weightmodel):
-        Counts.__init__(self, seq_lengths, patterns)
+    def __init__(self, seq_lengths, patterns, weightmodel, sparse=False):
+        Counts.__init__(self, seq_lengths, patterns, sparse)
         self.data = weightmodel.compute(self.data, patterns)
 
 
 class FreqsWeight(Freqs):
     """Store weighted freqs according to a given weight model."""
 
-    def __init__(self, seq_lengths, patterns, weightmodel):
-        Freqs.__init__(self, seq_lengths, patterns)
+    def __init__(self, seq_lengths, patterns, weightmodel, sparse=False):
+        Freqs.__init__(self, seq_lengths, patterns, sparse)
         self.data = weightmodel.compute(self.data, patterns)
 
 
@@ -248,6 +317,35 @@ class WordModel:
         value.append(1)
         return value
 
+    def overlap_capabilities(self, words):
+        """Calculate overlap capabilities of words of the same length
+        (see `overlap_capability`).
+
+        Returns:
+            ndarray of shape (number of words, word length)
+
+        """
+        chars = _word_chars(words)
+        length = chars.shape[1]
+        value = np.ones(chars.shape, dtype=np.int64)
+        for i in range(1, length):
+            value[:, i - 1] = np.all(chars[:, :i] == chars[:, length - i:],
+                                     axis=1)
+        return value
+
+    def word_probabilities(self, words):
+        """Calculate probabilities of words of the same length and of
+        their prefixes (see `probabilities`).
+
+        Subclasses may override it with a vectorized version.
+
+        Returns:
+            ndarray of shape (number of words, word length)
+
+        """
+        value = [self.probabilities(word) for word in words]
+        return np.array(value, dtype=float).reshape(len(value), -1)
+
     def var(self, word, seq_len, word_len=None, overlap_capability=None,
             word_probs=None):
         """Calculate the variance of word frequencies.
@@ -311,6 +409,40 @@ class WordModel:
             (n_L + 1) + 2 * p * sum(sum_term)
         return value
 
+    def var_matrix(self, words, seq_lengths):
+        """Calculate variances of frequencies (see `var`) of all words
+        in all sequences at once.
+
+        Overlap capabilities and probabilities are computed once per
+        word, and the formula is evaluated in broadcast form over
+        sequence lengths. The sum over k < min(L, n) is split into
+        n * sum(Q_{L-k} P_k) - sum(k Q_{L-k} P_k), both of which are
+        matrix products of a mask of terms of each sequence and terms
+        of each word.
+
+        Args:
+            words (list): words of the same length
+            seq_lengths (list): lengths of sequences
+
+        Returns:
+            ndarray of shape (number of sequences, number of words)
+
+        """
+        word_len = len(words[0])
+        overlaps = self.overlap_capabilities(words)
+        word_probs = self.word_probabilities(words)
+        p = word_probs[:, -1]
+        max_num = np.asarray(seq_lengths, dtype=float)[:, np.newaxis] - \
+            word_len + 1
+        k = np.arange(1, word_len)
+        terms = overlaps[:, word_len - k - 1] * word_probs[:, k - 1]
+        mask = (k < max_num).astype(float)
+        sum_term = max_num * mask.dot(terms.T) - mask.dot((terms * k).T)
+        mean = max_num * p
+        n_L = max_num - word_len
+        return (mean * (1 - mean) + p ** 2 * n_L * (n_L + 1) +
+                2 * p * sum_term)
+
 
 class EqualFreqs(WordModel):
     """Standarized word fequencies with word model that assumes equal
@@ -343,6 +475,10 @@ class EqualFreqs(WordModel):
             result.append(value)
         return result
 
+    def word_probabilities(self, words):
+        probs = np.cumprod(np.full(len(words[0]), self._avg_symbol_frequency))
+        return np.tile(probs, (len(words), 1))
+
 
 class EquilibriumFreqs(WordModel):
     """Standarized word fequencies with word model that assumes different
@@ -370,6 +506,13 @@ class EquilibriumFreqs(WordModel):
             result.append(value)
         return result
 
+    def word_probabilities(self, words):
+        chars = _word_chars(words)
+        uniq, inverse = np.unique(chars, return_inverse=True)
+        freqs = np.array([self._equilibrium_frequencies.get(chr(c), 0.0)
+                          for c in uniq.tolist()])
+        return np.cumprod(freqs[inverse.reshape(chars.shape)], axis=1)
+
 
 class Composition(Counts):
     """Composition vector (word counts) that subtracts random counts background.
@@ -395,12 +538,8 @@ class Composition(Counts):
         self._counts2 = Counts(seq_lengths, patterns2)
 
         self.__check_patlen()
-        self._lookup1 = {p: i for i, p in enumerate(patterns1.pat_list)}
-        self._lookup2 = {p: i for i, p in enumerate(patterns2.pat_list)}
-
-        for seqnum in range(len(seq_lengths)):
-            seqlen = self.seq_lengths[seqnum]
-            self.__composition(seqnum, seqlen)
+        self.data = self.__composition(patterns1.pat_list,
+                                       patterns2.pat_list)
 
     def __check_patlen(self):
 
@@ -411,47 +550,58 @@ class Composition(Counts):
 
             raise ValueError(msg)
 
-    def __markov_chain_freqs(self, seqnum, seqlen, patnum, patlen, pattern):
-        len1 = seqlen - patlen + 1
-        len2 = seqlen - patlen + 2
-        len3 = seqlen - patlen + 3
-
-        f = float(self.data[seqnum][patnum])
-
-        patternL = pattern[:-1]
-        patternR = pattern[1:]
-        patternLR = pattern[1:-1]
-        patnumL = self._lookup1[patternL]
-        patnumR = self._lookup1[patternR]
-        patnumLR = self._lookup2[patternLR]
-        fL = self._counts1[seqnum][patnumL]
-        fR = self._counts1[seqnum][patnumR]
-        fLR = self._counts2[seqnum][patnumLR]
-
-        if fLR != 0:
-            f0 = float(fL) * fR / fLR * (float(len1) * len3 / pow(len2, 2))
-        else:
-            f0 = 0.0
+    def __subword_indices(self, pat_list1, pat_list2):
+        """Return indices of (k-1)-prefixes, (k-1)-suffixes and
+        (k-2)-infixes of words in lists of shorter words."""
+        chars = _word_chars(self.pat_list)
+        patlen = self.patlen
+        result = []
+        for subwords, start, stop in [(pat_list1, 0, patlen - 1),
+                                      (pat_list1, 1, patlen),
+                                      (pat_list2, 1, patlen - 1)]:
+            subwords = np.asarray(subwords, dtype=str)
+            sub = np.ascontiguousarray(chars[:, start:stop])
+            sub = sub.view('U{}'.format(stop - start)).ravel()
+            order = np.argsort(subwords)
+            sorted_words = subwords[order]
+            pos = np.searchsorted(sorted_words, sub)
+            found = pos < len(sorted_words)
+            found[found] = sorted_words[pos[found]] == sub[found]
+            if not found.all():
+                raise KeyError(sub[~found][0])
+            result.append(order[pos])
+        return result
 
-        return f, f0
+    def __composition(self, pat_list1, pat_list2):
+        """Return (f - f0) / f0 for all sequences and words, where f0
+        is the count expected by the (k-2)th order Markov model:
+        f0 = f(L) * f(R) / f(LR) * (n1 * n3 / n2^2), with L, R and LR
+        being the (k-1)-prefix, (k-1)-suffix and (k-2)-infix of a word,
+        and n1, n2, n3 numbers of k, (k-1) and (k-2)-mers in a sequence.
+        Cells with undefined f0 or f0 = 0 are set to 0."""
+        idx_l, idx_r, idx_lr = self.__subword_indices(pat_list1, pat_list2)
+        seq_lengths = np.asarray(self.seq_lengths, dtype=float)[:, np.newaxis]
+        len1 = seq_lengths - self.patlen + 1
+        len2 = seq_lengths - self.patlen + 2
+        len3 = seq_lengths - self.patlen + 3
+        counts1 = self._counts1.data
+        f_lr = self._counts2.data[:, idx_lr]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            f0 = counts1[:, idx_l] * counts1[:, idx_r] / f_lr * \
+                (len1 * len3 / len2 ** 2)
+            f0[(f_lr == 0) | (len2 == 0) | np.isnan(f0)] = 0.0
+            value = (self.data - f0) / f0
+        value[f0 == 0] = 0.0
+        return value
 
-    def __composition(self, seqnum, seqlen):
-        compos = []
-        patlen = self.patlen
-        for patnum, pattern in enumerate(self.pat_list):
-            try:
-
-                f, f0 = self.__markov_chain_freqs(seqnum, seqlen, patnum,
-                                                  patlen, pattern)
-                if np.isnan(f0) or f0 == 0:
-                    value = 0.0
-                else:
-                    value = (f - f0) / f0
-
-            except ZeroDivisionError:
-                value = 0.0
-            compos.append(value)
-        self.data[seqnum] = compos
+
+def _word_chars(words):
+    """Return code points of characters of words of the same length
+    as a 2-D array (one row per word)."""
+    words = np.asarray(words, dtype=str)
+    length = len(words[0]) if len(words) else 0
+    words = np.ascontiguousarray(words, dtype='U{}'.format(max(length, 1)))
+    return words.view(np.uint32).reshape(len(words), -1)[:, :length]
 
 
 def _read_charval_file(handle):
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+# Copyright (c) 2016 Zielezinski A, combio.pl
+
+"""Compare the speed of Matrix.writer with the previous implementation
+that formatted every distance value in a Python loop.
+
+Usage:
+    python benchmarks/bench_distmatrix_writer.py [number_of_sequences]
+
+"""
+
+import io
+import sys
+import time
+
+import numpy as np
+
+from alfpy.utils import distmatrix
+
+
+def legacy_writer(matrix, handle, f, decimal_places):
+    """Matrix.writer as implemented in alfpy 1.0.6."""
+    if f == 'phylip':
+        handle.write("   {0}\n".format(len(matrix.id_list)))
+        for i, line in enumerate(matrix.data):
+            seqid = matrix.id_list[i][:10]
+            l = ['{0:.{1}f}'.format(line[i], decimal_places)
+                 for i in range(0, len(line))]
+            l.insert(0, '{0: <10}'.format(seqid))
+            handle.write(" ".join(l) + "\n")
+    elif f == 'pairwise':
+        for _, _, seqid1, seqid2, distval in matrix:
+            handle.write("{0}\t{1}\t{2:.{3}f}\n".format(seqid1, seqid2,
+                                                        distval,
+                                                        decimal_places))
+
+
+def timeit(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.RandomState(0)
+    data = rng.random_sample((size, size))
+    data = (data + data.T) / 2
+    np.fill_diagonal(data, 0)
+    id_list = ['seq{}'.format(i) for i in range(size)]
+    matrix = distmatrix.Matrix(id_list, data)
+
+    print('{0} x {0} matrix'.format(size))
+    for f in ['phylip', 'pairwise']:
+        old = io.StringIO()
+        new = io.StringIO()
+        t_old = timeit(legacy_writer, matrix, old, f, 7)
+        t_new = timeit(matrix.writer, new, f, 7)
+        identical = old.getvalue() == new.getvalue()
+        print('{0:<8} legacy: {1:8.3f}s  current: {2:8.3f}s  '
+              'speedup: {3:5.1f}x  identical: {4}'.format(
+                  f, t_old, t_new, t_old / max(t_new, 1e-9), identical))
+
+
+if __name__ == '__main__':
+    main()
@@ -28,11 +28,23 @@ def get_parser():
     group = parser.add_argument_group('OUTPUT ARGUMENTS')
     group.add_argument('--out', '-o', help="output filename",
                        metavar="FILE")
-    group.add_argument('--outfmt', choices=['phylip', 'pairwise'],
+    group.add_argument('--outfmt', choices=distmatrix.OUTPUT_FORMATS,
                        default='phylip',
                        help='distances output format [DEFAULT: %(default)s]')
+    group.add_argument('--top_k', metavar="N", type=int,
+                       help='output only N nearest neighbours of '
+                       'each sequence (requires --outfmt pairwise '
+                       'or npz)')
 
     group = parser.add_argument_group("OTHER OPTIONS")
+    group.add_argument('--query', metavar="FILE",
+                       help='query FASTA sequence filename; compute '
+                       'distances only between query and input '
+                       'sequences',
+                       type=argparse.FileType('r'))
+    group.add_argument('--threads', metavar="N", type=int, default=1,
+                       help='number of parallel processes '
+                       '[DEFAULT: %(default)s]')
     group.add_argument("-h", "--help", action="help",
                        help="show this help message and exit")
     group.add_argument('--version', action='version',
@@ -47,6 +59,14 @@ def get_parser():
 
 def validate_args(parser):
     args = parser.parse_args()
+    if args.threads < 1:
+        parser.error('number of threads must be >= 1')
+    if args.top_k is not None:
+        if args.top_k < 1:
+            parser.error('number of nearest neighbours must be >= 1')
+        if args.outfmt not in distmatrix.NEAREST_FORMATS:
+            parser.error('--top_k requires --outfmt {}'.format(
+                ' or '.join(distmatrix.NEAREST_FORMATS)))
     if args.word_size < 1:
         parser.error('--word_size must be >= 1')
     return args
@@ -57,17 +77,21 @@ def main():
     args = validate_args(parser)
 
     seq_records = seqrecords.read_fasta(args.fasta)
+    query_count = None
+    if args.query:
+        # Query sequences precede input (reference) sequences.
+        query_records = seqrecords.read_fasta(args.query)
+        query_count = query_records.count
+        seq_records = seqrecords.merge(query_records, seq_records)
 
     vector = fcgr.create_vectors(seq_records, args.word_size)
     dist = fcgr.Distance(vector)
-    matrix = distmatrix.create(seq_records.id_list, dist)
-
+    oh = open(args.out, 'w') if args.out else sys.stdout
+    distmatrix.write(oh, seq_records.id_list, dist, args.outfmt,
+                     workers=args.threads, query_count=query_count,
+                     top_k=args.top_k)
     if args.out:
-        oh = open(args.out, 'w')
-        matrix.write_to_file(oh, args.outfmt)
         oh.close()
-    else:
-        matrix.display(args.outfmt)
 
 
 if __name__ == '__main__':
@@ -48,6 +48,9 @@ def get_parser():
                        help='''file w/ weights of background sequence
                        characters (nt/aa)''',
                        type=argparse.FileType('r'))
+    group.add_argument('--sparse', action='store_true',
+                       help='''store only nonzero word counts of each
+                       sequence (for large word sizes)''')
 
     group = parser.add_argument_group('FREQUENCY MODEL ARGUMENTS',
                                       '''  Required for vector \'freqs_std\'.
@@ -62,11 +65,23 @@ def get_parser():
     group = parser.add_argument_group('OUTPUT ARGUMENTS')
     group.add_argument('--out', '-o', help="output filename",
                        metavar="FILE")
-    group.add_argument('--outfmt', choices=['phylip', 'pairwise'],
+    group.add_argument('--outfmt', choices=distmatrix.OUTPUT_FORMATS,
                        default='phylip',
                        help='distances output format [DEFAULT: %(default)s]')
+    group.add_argument('--top_k', metavar="N", type=int,
+                       help='output only N nearest neighbours of '
+                       'each sequence (requires --outfmt pairwise '
+                       'or npz)')
 
     group = parser.add_argument_group("OTHER OPTIONS")
+    group.add_argument('--query', metavar="FILE",
+                       help='query FASTA sequence filename; compute '
+                       'distances only between query and input '
+                       'sequences',
+                       type=argparse.FileType('r'))
+    group.add_argument('--threads', metavar="N", type=int, default=1,
+                       help='number of parallel processes '
+                       '[DEFAULT: %(default)s]')
     group.add_argument("-h", "--help", action="help",
                        help="show this help message and exit")
     group.add_argument('--version', action='version',
@@ -82,6 +97,16 @@ def get_parser():
 
 def validate_args(parser):
     args = parser.parse_args()
+    if args.threads < 1:
+        parser.error('number of threads must be >= 1')
+    if args.top_k is not None:
+        if args.top_k < 1:
+            parser.error('number of nearest neighbours must be >= 1')
+        if args.outfmt not in distmatrix.NEAREST_FORMATS:
+            parser.error('--top_k requires --outfmt {}'.format(
+                ' or '.join(distmatrix.NEAREST_FORMATS)))
+    if args.query and args.word_pattern:
+        parser.error('--query cannot be used with --word_pattern')
     if args.word_size:
         if args.word_size < 1:
             parser.error('word size must be >= 1')
@@ -93,6 +118,9 @@ def validate_args(parser):
     if args.distance == 'kld' and args.vector != 'freqs':
         parser.error("--distance kld requires --vector freqs.")
 
+    if args.sparse and args.vector == 'freqs_std':
+        parser.error("--sparse requires --vector counts or freqs")
+
     if args.char_weights is not None:
         if args.vector == 'freqs_std':
             e = '--char_weights requires a vector of either \'freqs\''
@@ -135,9 +163,16 @@ def main():
     args = validate_args(parser)
 
     seq_records = seqrecords.read_fasta(args.fasta)
+    query_count = None
+    if args.query:
+        # Query sequences precede input (reference) sequences.
+        query_records = seqrecords.read_fasta(args.query)
+        query_count = query_records.count
+        seq_records = seqrecords.merge(query_records, seq_records)
 
     if args.word_size:
-        p = word_pattern.create(seq_records.seq_list, args.word_size)
+        p = word_pattern.create(seq_records.seq_list, args.word_size,
+                                workers=args.threads)
     else:
         p = word_pattern.read(args.word_pattern)
 
@@ -149,11 +184,13 @@ def main():
 
     if args.vector == 'counts' or args.vector == 'freqs':
         if args.char_weights is None:
-            vec = veccls[args.vector](seq_records.length_list, p)
+            vec = veccls[args.vector](seq_records.length_list, p,
+                                      sparse=args.sparse)
         else:
             weightmodel = word_vector.WeightModel(
                 char_weights=args.char_weights)
-            vec = vecclsw[args.vector](seq_records.length_list, p, weightmodel)
+            vec = vecclsw[args.vector](seq_records.length_list, p, weightmodel,
+                                       sparse=args.sparse)
     else:
         if args.alphabet_size:
             freqmodel = word_vector.EqualFreqs(
@@ -163,14 +200,12 @@ def main():
         vec = word_vector.FreqsStd(seq_records.length_list, p, freqmodel)
 
     dist = word_distance.Distance(vec, args.distance)
-    matrix = distmatrix.create(seq_records.id_list, dist)
-
+    oh = open(args.out, 'w') if args.out else sys.stdout
+    distmatrix.write(oh, seq_records.id_list, dist, args.outfmt,
+                     workers=args.threads, query_count=query_count,
+                     top_k=args.top_k)
     if args.out:
-        oh = open(args.out, 'w')
-        matrix.write_to_file(oh, args.outfmt)
         oh.close()
-    else:
-        matrix.display(args.outfmt)
 
 
 if __name__ == '__main__':
@@ -28,6 +28,9 @@ def get_parser():
                        help='''report word positions in output''')
     group.add_argument('--out', '-o', help="output pattern filename",
                        metavar="FILE")
+    group.add_argument('--binary', '-b', action="store_true",
+                       help='''write patterns in binary format, loaded
+                       (memory-mapped) faster by --word_pattern options''')
 
     t = '  Teiresias options'
     d = '  more info @ https://cm.jefferson.edu/data-tools-downloads/'
@@ -43,6 +46,9 @@ def get_parser():
                        help='minimum support that any word can have')
 
     group = parser.add_argument_group("OTHER OPTIONS")
+    group.add_argument('--threads', metavar="N", type=int, default=1,
+                       help='number of parallel processes counting words '
+                       '[DEFAULT: %(default)s]')
     group.add_argument("-h", "--help", action="help",
                        help="show this help message and exit")
     group.add_argument('--version', action='version',
@@ -58,6 +64,8 @@ def get_parser():
 
 def validate_args(parser):
     args = parser.parse_args()
+    if args.threads < 1:
+        parser.error('number of threads must be >= 1')
     if args.teiresias:
         if args.l is None:
             parser.error("Teiresias requires --l")
@@ -90,9 +98,15 @@ def main():
         args.fasta.close()
         p = word_pattern.create(seq_records.seq_list,
                                 args.word_size,
-                                args.word_position)
-
-    if args.out:
+                                args.word_position,
+                                workers=args.threads)
+
+    if args.binary:
+        oh = open(args.out, 'wb') if args.out else sys.stdout
+        word_pattern.write_binary(oh, p)
+        if args.out:
+            oh.close()
+    elif args.out:
         oh = open(args.out, 'w')
         oh.write(p.format())
         oh.close()
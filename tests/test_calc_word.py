@@ -1,5 +1,8 @@
+import os
 import unittest
 
+from alfpy.utils import distmatrix
+
 from . import utils
 
 
@@ -154,6 +157,104 @@ class ScriptTest(unittest.TestCase, utils.ScriptsWordCommonTest):
         self.assertEqual(returncode, 0)
         self.assertEqual(md5, 'ea1f990dbf28f220496f6a95ff91087b')
 
+    def test_output_word_size2_freqs_euclid_sqaured_pairwise_sparse(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs', '--distance',
+                'euclid_squared', '--outfmt', 'pairwise', '--sparse']
+        returncode, out, md5 = self._test_output(self.script_name, args)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(md5, '0f1f15adccf53668a1d2ad776e53bf25')
+
+    def test_arg_sparse_freqs_std(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs_std', '--alphabet_size', '20',
+                '--sparse']
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 2)
+        self.assertIn('error: --sparse requires --vector counts or freqs',
+                      out)
+
+    def test_output_word_size2_freqs_euclid_sqaured_pairwise_threads(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs', '--distance',
+                'euclid_squared', '--outfmt', 'pairwise', '--threads', '2']
+        returncode, out, md5 = self._test_output(self.script_name, args)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(md5, '0f1f15adccf53668a1d2ad776e53bf25')
+
+    def test_output_word_size2_freqs_euclid_squared_npz(self):
+        output_filename = '{}.npz'.format(self.filename_pep)
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs', '--distance', 'euclid_squared',
+                '--outfmt', 'npz', '--out', output_filename]
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 0)
+        matrix = distmatrix.read(output_filename)
+        self.assertEqual(len(matrix.id_list), 4)
+        self.assertEqual(matrix.data.shape, (6,))
+        del matrix
+        os.remove(output_filename)
+
+    def test_output_query_pairwise(self):
+        # Queries (seq1, seq2) vs references (seq3, seq4) of pep.fa.
+        query_filename = '{}.query.fa'.format(self.filename_pep)
+        ref_filename = '{}.ref.fa'.format(self.filename_pep)
+        fh = open(self.filename_pep)
+        records = fh.read().split('>')[1:]
+        fh.close()
+        for filename, part in [(query_filename, records[:2]),
+                               (ref_filename, records[2:])]:
+            oh = open(filename, 'w')
+            oh.write(''.join('>' + r for r in part))
+            oh.close()
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs', '--distance', 'euclid_squared',
+                '--outfmt', 'pairwise']
+        returncode, out = utils.runscript(self.script_name, args)
+        exp = [line for line in out.splitlines()
+               if line.split('\t')[0] in ('seq1', 'seq2') and
+               line.split('\t')[1] in ('seq3', 'seq4')]
+        args = ['--fasta', ref_filename, '--query', query_filename,
+                '--word_size', '2', '--vector', 'freqs', '--distance',
+                'euclid_squared', '--outfmt', 'pairwise']
+        returncode, out = utils.runscript(self.script_name, args)
+        os.remove(query_filename)
+        os.remove(ref_filename)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(out.splitlines(), exp)
+
+    def test_arg_query_with_word_pattern(self):
+        args = ['--fasta', self.filename_pep, '--query', self.filename_pep,
+                '--word_pattern', self.filename_pep]
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 2)
+        self.assertIn('error: --query cannot be used with --word_pattern',
+                      out)
+
+    def test_output_top_k(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--vector', 'freqs', '--distance', 'euclid_squared',
+                '--outfmt', 'pairwise', '--top_k', '1']
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 0)
+        lines = out.splitlines()
+        self.assertEqual([line.split('\t')[0] for line in lines],
+                         ['seq1', 'seq2', 'seq3', 'seq4'])
+
+    def test_arg_top_k_phylip(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--top_k', '1']
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 2)
+        self.assertIn('error: --top_k requires --outfmt pairwise or npz', out)
+
+    def test_arg_threads_0(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--threads', '0']
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 2)
+        self.assertIn('error: number of threads must be >= 1', out)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,4 @@
+import os
 import unittest
 
 from . import utils
@@ -63,6 +64,20 @@ class ScriptTest(unittest.TestCase, utils.ScriptsCommonTest):
         self.assertEqual(returncode, 0)
         self.assertEqual(md5, '040e121be77617191c7d7c847edafc8e')
 
+    def test_output_word_size_2_threads(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--threads', '2']
+        returncode, out, md5 = self._test_output(self.script_name, args)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(md5, '2aea23ad3e883708dc2f95111f7f04ec')
+
+    def test_arg_threads_0(self):
+        args = ['--fasta', self.filename_pep, '--word_size', '2',
+                '--threads', '0']
+        returncode, out = utils.runscript(self.script_name, args)
+        self.assertEqual(returncode, 2)
+        self.assertIn('error: number of threads must be >= 1', out)
+
     def test_output_word_size_1(self):
         args = ['--fasta', self.filename_pep, '--word_size', '1']
         returncode, out, md5 = self._test_output(self.script_name, args)
@@ -70,5 +85,29 @@ class ScriptTest(unittest.TestCase, utils.ScriptsCommonTest):
         self.assertEqual(md5, '2d4dd98798cb6320975f6919fe43b777')
 
 
+    def test_output_binary_word_pattern(self):
+        for word_position, script_name in [(False, 'calc_word.py'),
+                                           (True, 'calc_word_rtd.py')]:
+            args = ['--fasta', self.filename_pep, '--word_size', '2',
+                    '--binary', '--out', 'pep.fa.2mer.bin']
+            if word_position:
+                args.append('--word_position')
+            returncode, out = utils.runscript(self.script_name, args)
+            self.assertEqual(returncode, 0)
+            try:
+                args = ['--fasta', self.filename_pep, '--word_pattern']
+                returncode, out = utils.runscript(
+                    script_name, args + ['pep.fa.2mer.bin'])
+                self.assertEqual(returncode, 0)
+                text_filename = utils.get_test_data(
+                    'pep.fa.2mer.wordpos.txt' if word_position
+                    else 'pep.fa.2mer.txt')
+                returncode, expected = utils.runscript(
+                    script_name, args + [text_filename])
+                self.assertEqual(out, expected)
+            finally:
+                os.remove('pep.fa.2mer.bin')
+
+
 if __name__ == '__main__':
     unittest.main()
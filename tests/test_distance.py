@@ -1,3 +1,4 @@
+import numpy as np
 import unittest
 
 from alfpy import word_pattern
@@ -79,5 +80,31 @@ class DistanceTest(unittest.TestCase, utils.ModulesCommonTest):
             dist.set_disttype('nonexistent')
         self.assertIn('unknown disttype', str(context.exception))
 
+    def test_block_reduce_chunks(self):
+        x = np.arange(12, dtype=float).reshape(3, 4)
+        y = x[::-1] * 0.5
+        exp = distance.block_reduce(np.minimum, x, y)
+        buffer_size = distance.BLOCK_BUFFER_SIZE
+        try:
+            # Force one column per chunk.
+            distance.BLOCK_BUFFER_SIZE = 1
+            value = distance.block_reduce(np.minimum, x, y)
+        finally:
+            distance.BLOCK_BUFFER_SIZE = buffer_size
+        self.assertTrue(np.allclose(value, exp))
+        self.assertEqual(value[0, 0], np.sum(np.minimum(x[0], y[0])))
+
+
+    def test_block_euclid_squared(self):
+        x = np.array([[1e8, 1.0, 2.0], [1e8, 1.0, 2.0], [1e8, 1.0, 2.5],
+                      [0.0, 0.0, 0.0], [3.0, -1.0, 0.5]])
+        exp = distance.block_reduce(lambda u, v: (u - v)**2, x, x)
+        value = distance.block_euclid_squared(x, x)
+        self.assertTrue(np.allclose(value, exp, rtol=1e-12, atol=0))
+        self.assertEqual(value[0, 1], 0.0)
+        self.assertEqual(value[0, 2], 0.25)
+        self.assertTrue(np.all(np.diag(value) == 0))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,6 @@
 import numpy as np
 import os
+import sys
 import unittest
 
 from alfpy import word_distance
@@ -102,6 +103,30 @@ class TestDistMatrix(unittest.TestCase):
         ]
         self.assertEqual(result, "\n".join(exp))
 
+    def test_write_to_file_percent_ids_small_buffer(self):
+        self.matrix.id_list = ['seq%1', 'seq%s', 'seq3']
+        buffer_size = distmatrix.WRITE_BUFFER_SIZE
+        distmatrix.WRITE_BUFFER_SIZE = 1
+        try:
+            for f in ['phylip', 'pairwise']:
+                oh = open(self.output_filename, 'w')
+                self.matrix.write_to_file(oh, f, 4)
+                oh.close()
+                fh = open(self.output_filename)
+                result = fh.read()
+                fh.close()
+                if f == 'phylip':
+                    exp = self.matrix.format(4) + "\n"
+                else:
+                    exp = "".join(
+                        "{0}\t{1}\t{2:.4f}\n".format(seqid1, seqid2, val)
+                        for _, _, seqid1, seqid2, val in self.matrix)
+                self.assertEqual(result, exp)
+        finally:
+            distmatrix.WRITE_BUFFER_SIZE = buffer_size
+        os.remove(self.output_filename)
+        self.assertIn('seq%s      0.3532', self.matrix.format(4))
+
     def test_iter(self):
         exp = [(0, 1, 'seq1', 'seq2', 0.35315869999999999),
                (0, 2, 'seq1', 'seq3', 0.35509332999999998),
@@ -124,6 +149,383 @@ class TestDistMatrix(unittest.TestCase):
         ]
         self.assertEqual(matrix.format(), "\n".join(exp))
 
+    def test_create_matrix_block_equals_pairwise(self):
+        l = [[3, 6, 4, 1, 3, 4, 3, 0, 1, 1, 6, 4, 5, 0, 3, 4],
+             [0, 3, 0, 3, 0, 0, 0, 2, 9, 0, 3, 3, 0, 6, 3, 6],
+             [9, 0, 0, 3, 0, 0, 0, 2, 6, 0, 3, 3, 0, 3, 3, 3],
+             [1, 1, 2, 0, 5, 0, 1, 2, 0, 4, 3, 0, 0, 3, 1, 3]]
+        vector = np.array(l)
+        id_list = ['seq1', 'seq2', 'seq3', 'seq4']
+        disttypes = ['euclid_squared', 'euclid_norm', 'google',
+                     'angle_cos_diss', 'angle_cos_evol', 'manhattan']
+        for disttype in disttypes:
+            dist = word_distance.Distance(vector, disttype)
+            self.assertIsNotNone(dist.block_distance)
+            matrix = distmatrix.create(id_list, dist)
+            # Force the pair-by-pair computation.
+            dist.block_distance = None
+            exp = distmatrix.create(id_list, dist)
+            self.assertTrue(np.allclose(matrix.data, exp.data))
+
+    def test_create_matrix_tiles(self):
+        vector = np.arange(7 * 5).reshape(7, 5) % 4
+        id_list = ['seq{}'.format(i) for i in range(7)]
+        dist = word_distance.Distance(vector, 'manhattan')
+        exp = distmatrix.create(id_list, dist)
+        for tile_size in [1, 2, 3, 6, 7, 100]:
+            matrix = distmatrix.create(id_list, dist, tile_size)
+            self.assertTrue(np.array_equal(matrix.data, exp.data))
+
+    def test_create_matrix_workers(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        for disttype in ['manhattan', 'minkowski']:
+            dist = word_distance.Distance(vector, disttype)
+            exp = distmatrix.create(id_list, dist)
+            matrix = distmatrix.create(id_list, dist, tile_size=4,
+                                       workers=2)
+            self.assertTrue(np.allclose(matrix.data, exp.data))
+
+    def test_iter_row_chunks(self):
+        chunks = list(distmatrix.iter_row_chunks(5, 2))
+        self.assertEqual(chunks, [(0, 2), (2, 4)])
+        chunks = list(distmatrix.iter_row_chunks(100, 8))
+        pairs = [sum(100 - 1 - i for i in range(a, b)) for a, b in chunks]
+        self.assertEqual(sum(pairs), 100 * 99 // 2)
+        self.assertEqual(chunks[-1][1], 99)
+
+    def test_create_matrix_memmap(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        filename = utils.get_test_data('distmatrix.dat')
+        dist = word_distance.Distance(vector, 'manhattan')
+        exp = distmatrix.create(id_list, dist)
+        matrix = distmatrix.create(id_list, dist, filename=filename)
+        self.assertIsInstance(matrix.data, np.memmap)
+        self.assertEqual(matrix.format(), exp.format())
+        del matrix
+        matrix = distmatrix.read_memmap(filename)
+        self.assertEqual(matrix.id_list, id_list)
+        self.assertTrue(np.array_equal(matrix.data, exp.data))
+        self.assertEqual(list(matrix), list(exp))
+        self.assertEqual(matrix.max(), exp.max())
+        del matrix
+        matrix = distmatrix.read_memmap(filename, 'r+')
+        matrix.normalize()
+        exp.normalize()
+        self.assertEqual(matrix.format(), exp.format())
+        del matrix
+        os.remove(filename)
+
+    def test_read_memmap_throws_exception(self):
+        with self.assertRaises(ValueError):
+            distmatrix.read_memmap(utils.get_test_data('dna.fa'))
+
+    def test_min_max_chunks(self):
+        chunk_size = distmatrix.CHUNK_SIZE
+        try:
+            distmatrix.CHUNK_SIZE = 1
+            self.assertEqual(len(list(self.matrix._iter_chunks())), 3)
+            self.assertEqual(self.matrix.max(), 0.35509333)
+            self.assertEqual(self.matrix.min(), 0)
+            self.assertEqual(len(list(self.matrix)), 3)
+        finally:
+            distmatrix.CHUNK_SIZE = chunk_size
+
+    def test_create_condensed_matrix(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        for disttype in ['manhattan', 'minkowski']:
+            dist = word_distance.Distance(vector, disttype)
+            exp = distmatrix.create(id_list, dist)
+            matrix = distmatrix.create(id_list, dist, tile_size=4,
+                                       condensed=True)
+            self.assertIsInstance(matrix, distmatrix.CondensedMatrix)
+            self.assertEqual(matrix.data.shape, (36,))
+            self.assertTrue(np.array_equal(matrix.square(), exp.data))
+            self.assertEqual(list(matrix), list(exp))
+            self.assertEqual(matrix.format(), exp.format())
+            self.assertEqual(matrix.highcharts(), exp.highcharts())
+            self.assertEqual(matrix.min(), exp.min())
+            self.assertEqual(matrix.max(), exp.max())
+            matrix.normalize()
+            exp.normalize()
+            self.assertEqual(matrix.format(), exp.format())
+
+    def test_condensed_matrix_float32(self):
+        i, j = np.triu_indices(3, 1)
+        data = self.matrix.data[i, j].astype(np.float32)
+        matrix = distmatrix.CondensedMatrix(self.matrix.id_list, data)
+        self.assertEqual(matrix.format(3), self.matrix.format(3))
+        self.assertEqual(matrix.square().dtype, np.float32)
+        for f in ['phylip', 'pairwise']:
+            oh = open(self.output_filename, 'w')
+            matrix.write_to_file(oh, f, 3)
+            oh.close()
+            fh = open(self.output_filename)
+            result = fh.read()
+            fh.close()
+            oh = open(self.output_filename, 'w')
+            self.matrix.write_to_file(oh, f, 3)
+            oh.close()
+            fh = open(self.output_filename)
+            self.assertEqual(result, fh.read())
+            fh.close()
+        os.remove(self.output_filename)
+
+    def test_create_condensed_matrix_memmap(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        filename = utils.get_test_data('distmatrix.dat')
+        dist = word_distance.Distance(vector, 'manhattan')
+        exp = distmatrix.create(id_list, dist)
+        matrix = distmatrix.create(id_list, dist, filename=filename,
+                                   condensed=True, dtype=np.float32)
+        del matrix
+        matrix = distmatrix.read_memmap(filename)
+        self.assertIsInstance(matrix, distmatrix.CondensedMatrix)
+        self.assertEqual(matrix.data.dtype, np.float32)
+        self.assertEqual(matrix.format(), exp.format())
+        del matrix
+        os.remove(filename)
+
+    def test_write_pairwise(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        chunk_size = distmatrix.CHUNK_SIZE
+        for disttype in ['manhattan', 'minkowski']:
+            dist = word_distance.Distance(vector, disttype)
+            matrix = distmatrix.create(id_list, dist)
+            oh = open(self.output_filename, 'w')
+            matrix.write_to_file(oh, 'pairwise')
+            oh.close()
+            fh = open(self.output_filename)
+            exp = fh.read()
+            fh.close()
+            for size in [chunk_size, 20]:
+                distmatrix.CHUNK_SIZE = size
+                try:
+                    oh = open(self.output_filename, 'w')
+                    distmatrix.write_pairwise(oh, id_list, dist)
+                    oh.close()
+                finally:
+                    distmatrix.CHUNK_SIZE = chunk_size
+                fh = open(self.output_filename)
+                self.assertEqual(fh.read(), exp)
+                fh.close()
+        os.remove(self.output_filename)
+
+    def test_write_pairwise_threshold(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        dist = word_distance.Distance(vector, 'manhattan')
+        matrix = distmatrix.create(id_list, dist)
+        oh = open(self.output_filename, 'w')
+        distmatrix.write_pairwise(oh, id_list, dist, 3, threshold=10)
+        oh.close()
+        fh = open(self.output_filename)
+        result = fh.read()
+        fh.close()
+        os.remove(self.output_filename)
+        exp = ["{0}\t{1}\t{2:.3f}\n".format(seqid1, seqid2, distval)
+               for _, _, seqid1, seqid2, distval in matrix if distval <= 10]
+        self.assertTrue(0 < len(exp) < 36)
+        self.assertEqual(result, "".join(exp))
+
+    def test_iter_row_bands(self):
+        bands = list(distmatrix.iter_row_bands(5, 2))
+        self.assertEqual(bands, [(slice(0, 2), slice(0, 5)),
+                                 (slice(2, 4), slice(2, 5)),
+                                 (slice(4, 5), slice(4, 5))])
+
+    def test_write_read_binary_formats(self):
+        filename = utils.get_test_data('distmatrix.bin')
+        i, j = np.triu_indices(3, 1)
+        condensed = distmatrix.CondensedMatrix(self.matrix.id_list,
+                                               self.matrix.data[i, j])
+        for matrix in [self.matrix, condensed]:
+            for f in distmatrix.BINARY_FORMATS:
+                # Binary formats can be written to files opened in text mode.
+                oh = open(filename, 'w')
+                matrix.write_to_file(oh, f)
+                oh.close()
+                result = distmatrix.read(filename)
+                self.assertIsInstance(result, distmatrix.CondensedMatrix)
+                self.assertEqual(result.id_list, self.matrix.id_list)
+                if f == 'npz':
+                    self.assertIsInstance(result.data, np.memmap)
+                    self.assertEqual(result.format(), self.matrix.format())
+                else:
+                    self.assertEqual(result.data.dtype, np.float32)
+                    self.assertEqual(result.format(5),
+                                     self.matrix.format(5))
+                del result
+        os.remove(filename)
+
+    def test_read_pairwise_bin_records(self):
+        filename = utils.get_test_data('distmatrix.bin')
+        oh = open(filename, 'wb')
+        self.matrix.write_to_file(oh, 'pairwise_bin')
+        oh.close()
+        header, offset = distmatrix._read_header(filename,
+                                                 distmatrix.PAIRWISE_MAGIC)
+        self.assertEqual(offset % 64, 0)
+        records = np.fromfile(filename, dtype=distmatrix.PAIRWISE_DTYPE,
+                              offset=offset)
+        self.assertEqual(records['i'].tolist(), [0, 0, 1])
+        self.assertEqual(records['j'].tolist(), [1, 2, 2])
+        os.remove(filename)
+
+    def test_read_memmap_file(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        filename = utils.get_test_data('distmatrix.dat')
+        dist = word_distance.Distance(vector, 'manhattan')
+        exp = distmatrix.create(id_list, dist, filename=filename)
+        matrix = distmatrix.read(filename)
+        self.assertEqual(matrix.format(), exp.format())
+        del matrix, exp
+        os.remove(filename)
+
+    def test_create_rectangular_equals_square_part(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        for disttype in ['manhattan', 'minkowski']:
+            dist = word_distance.Distance(vector, disttype)
+            exp = distmatrix.create(id_list, dist).data[:3, 3:]
+            for tile_size, workers in [(512, 1), (2, 1), (2, 2)]:
+                matrix = distmatrix.create_rectangular(
+                    id_list, 3, dist, tile_size, workers)
+                self.assertIsInstance(matrix, distmatrix.RectangularMatrix)
+                self.assertEqual(matrix.id_list, id_list[:3])
+                self.assertEqual(matrix.ref_id_list, id_list[3:])
+                self.assertTrue(np.allclose(matrix.data, exp))
+
+    def test_rectangular_matrix_format(self):
+        matrix = distmatrix.RectangularMatrix(
+            ['seq1'], ['seq2', 'seq3'], self.matrix.data[:1, 1:])
+        exp = [
+            '   1 2',
+            'seq1       0.3531587 0.3550933'
+        ]
+        self.assertEqual(matrix.format(), "\n".join(exp))
+        self.assertEqual([x[:4] for x in matrix],
+                         [(0, 0, 'seq1', 'seq2'), (0, 1, 'seq1', 'seq3')])
+        with self.assertRaises(ValueError):
+            matrix.condensed()
+
+    def test_write_pairwise_query(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        dist = word_distance.Distance(vector, 'minkowski')
+        matrix = distmatrix.create_rectangular(id_list, 4, dist)
+        exp = ["{0}\t{1}\t{2:.7f}\n".format(seqid1, seqid2, distval)
+               for _, _, seqid1, seqid2, distval in matrix]
+        self.assertEqual(len(exp), 20)
+        chunk_size = distmatrix.CHUNK_SIZE
+        for size in [chunk_size, 7]:
+            distmatrix.CHUNK_SIZE = size
+            try:
+                oh = open(self.output_filename, 'w')
+                distmatrix.write(oh, id_list, dist, 'pairwise',
+                                 query_count=4)
+                oh.close()
+            finally:
+                distmatrix.CHUNK_SIZE = chunk_size
+            fh = open(self.output_filename)
+            self.assertEqual(fh.read(), "".join(exp))
+            fh.close()
+        os.remove(self.output_filename)
+
+    def test_write_read_rectangular_binary_formats(self):
+        filename = utils.get_test_data('distmatrix.bin')
+        vector = np.arange(6 * 5).reshape(6, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(6)]
+        dist = word_distance.Distance(vector, 'manhattan')
+        for f in distmatrix.BINARY_FORMATS:
+            oh = open(filename, 'w')
+            distmatrix.write(oh, id_list, dist, f, query_count=2)
+            oh.close()
+            matrix = distmatrix.read(filename)
+            self.assertIsInstance(matrix, distmatrix.RectangularMatrix)
+            self.assertEqual(matrix.id_list, id_list[:2])
+            self.assertEqual(matrix.ref_id_list, id_list[2:])
+            exp = distmatrix.create(id_list, dist).data[:2, 2:]
+            self.assertTrue(np.allclose(matrix.data, exp))
+            del matrix
+        exp = distmatrix.create_rectangular(id_list, 2, dist,
+                                            filename=filename)
+        matrix = distmatrix.read(filename)
+        self.assertIsInstance(matrix, distmatrix.RectangularMatrix)
+        self.assertEqual(matrix.format(), exp.format())
+        del matrix, exp
+        os.remove(filename)
+
+    def test_nearest(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        for disttype in ['manhattan', 'minkowski']:
+            dist = word_distance.Distance(vector, disttype)
+            square = distmatrix.create(id_list, dist).data.copy()
+            np.fill_diagonal(square, np.inf)
+            exp = np.sort(square, axis=1)[:, :3]
+            for tile_size, workers in [(512, 1), (2, 1), (4, 2)]:
+                neighbors = distmatrix.nearest(id_list, dist, 3, tile_size,
+                                               workers)
+                self.assertEqual(neighbors.indices.shape, (9, 3))
+                self.assertTrue(np.allclose(neighbors.distances, exp))
+                found = square[np.arange(9)[:, np.newaxis],
+                               neighbors.indices]
+                self.assertTrue(np.allclose(found, exp))
+
+    def test_nearest_k_greater_than_size(self):
+        neighbors = distmatrix.nearest(
+            ['seq1', 'seq2', 'seq3'],
+            word_distance.Distance(np.array([[0, 1], [0, 3], [2, 1]]),
+                                   'manhattan'), 5)
+        self.assertEqual(neighbors.indices.tolist(), [[1, 2], [0, 2],
+                                                      [0, 1]])
+        exp = [
+            'seq1\tseq2\t2.00',
+            'seq1\tseq3\t2.00',
+            'seq2\tseq1\t2.00',
+            'seq2\tseq3\t4.00',
+            'seq3\tseq1\t2.00',
+            'seq3\tseq2\t4.00'
+        ]
+        self.assertEqual(neighbors.format(2), "\n".join(exp))
+        with self.assertRaises(ValueError):
+            distmatrix.nearest(['seq1'], None, 0)
+
+    def test_nearest_query(self):
+        vector = np.arange(9 * 5).reshape(9, 5) % 7
+        id_list = ['seq{}'.format(i) for i in range(9)]
+        dist = word_distance.Distance(vector, 'minkowski')
+        data = distmatrix.create_rectangular(id_list, 3, dist).data
+        neighbors = distmatrix.nearest(id_list, dist, 2, tile_size=2,
+                                       query_count=3)
+        self.assertEqual(neighbors.id_list, id_list[:3])
+        self.assertEqual(neighbors.ref_id_list, id_list[3:])
+        self.assertTrue(np.allclose(neighbors.distances,
+                                    np.sort(data, axis=1)[:, :2]))
+        oh = open(self.output_filename, 'w')
+        distmatrix.write(oh, id_list, dist, 'pairwise', 3, query_count=3,
+                         top_k=2)
+        oh.close()
+        fh = open(self.output_filename)
+        self.assertEqual(fh.read(), neighbors.format(3) + "\n")
+        fh.close()
+        os.remove(self.output_filename)
+        with self.assertRaises(ValueError):
+            neighbors.writer(sys.stdout, 'phylip', 7)
+
+    def test_iter_tiles(self):
+        tiles = list(distmatrix.iter_tiles(5, 2))
+        self.assertEqual(len(tiles), 6)
+        self.assertEqual(tiles[-1], (slice(4, 5), slice(4, 5)))
+        with self.assertRaises(ValueError):
+            list(distmatrix.iter_tiles(5, 0))
+
     def test_highcharts(self):
         self.assertEqual(len(self.matrix.highcharts()), 3)
 
@@ -68,5 +68,14 @@ class SeqRecordsTest(unittest.TestCase):
         ]
         self.assertEqual(rec.fasta(wrap=30), "\n".join(exp))
 
+    def test_merge(self):
+        rec1 = seqrecords.SeqRecords(
+            id_list=self.ID_LIST[:1], seq_list=self.SEQ_LIST[:1])
+        rec2 = seqrecords.SeqRecords(
+            id_list=self.ID_LIST[1:], seq_list=self.SEQ_LIST[1:])
+        rec = seqrecords.merge(rec1, rec2)
+        self._validate_seqrecords(rec)
+        self.assertEqual(rec1.count, 1)
+
 if __name__ == '__main__':
     unittest.main()
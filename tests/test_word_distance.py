@@ -1,3 +1,4 @@
+import numpy as np
 import unittest
 
 from alfpy import word_pattern
@@ -233,6 +234,29 @@ class DistanceTest(unittest.TestCase, utils.ModulesCommonTest):
                 'seq3       0.3809524 0.3949580 0.0000000']
         self.assertEqual(matrix.format(), "\n".join(data))
 
+    def test_sparse_equals_dense(self):
+        freqs = word_vector.Freqs(self.dna_records.length_list,
+                                  self.pattern, sparse=True)
+        for disttype in word_distance.Distance.get_disttypes():
+            dist = word_distance.Distance(self.freqs, disttype)
+            matrix1 = distmatrix.create(self.dna_records.id_list, dist)
+            dist = word_distance.Distance(freqs, disttype)
+            matrix2 = distmatrix.create(self.dna_records.id_list, dist,
+                                        tile_size=2)
+            self.assertEqual(matrix1.format(), matrix2.format())
+
+
+    def test_euclid_block_equals_pairwise(self):
+        for disttype in ['euclid_squared', 'euclid_norm',
+                         'euclid_seqlen1', 'euclid_seqlen2']:
+            dist = word_distance.Distance(self.freqs, disttype)
+            self.assertIsNotNone(dist.block_distance)
+            value = dist.block_distance(slice(0, 3), np.array([2, 0]))
+            for i in range(3):
+                for n, j in enumerate([2, 0]):
+                    self.assertAlmostEqual(
+                        value[i, n], dist.pairwise_distance(i, j), places=12)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,6 @@
+import gzip
 import os
+import tempfile
 import unittest
 
 from alfpy import word_pattern
@@ -165,6 +167,147 @@ class Test(unittest.TestCase, utils.ModulesCommonTest):
         md5 = utils.calc_md5(p.format())
         self.assertEqual(md5, '2d4dd98798cb6320975f6919fe43b777')
 
+    def test_create_from_bigfasta_blocks_gzip(self):
+        # Sequences wrapped at 7 characters, read in tiny blocks.
+        filename = '{}.wrapped.fa.gz'.format(self.pep_filename)
+        fh = gzip.open(filename, 'wt')
+        for seqid, seq in zip(self.pep_records.id_list,
+                              self.pep_records.seq_list):
+            fh.write('>{}\n'.format(seqid))
+            for i in range(0, len(seq), 7):
+                fh.write('{}\r\n'.format(seq[i:i + 7]))
+        fh.close()
+        for k in [1, 2, 5, 16]:
+            p1 = word_pattern.create(self.pep_records.seq_list, k)
+            for block_size in [10, 2**22]:
+                p2 = word_pattern.create_from_bigfasta(filename, k,
+                                                       block_size)
+                self.assertEqual(p2.format(), p1.format())
+        os.remove(filename)
+
+    def test_create_integer_encoded_equals_strings(self):
+        seqs = self.pep_records.seq_list + ['', 'A', 'ACDX', 'acd']
+        chunk_size = word_pattern.COUNT_CHUNK_SIZE
+        for size in [chunk_size, 30]:
+            word_pattern.COUNT_CHUNK_SIZE = size
+            try:
+                for k in [1, 2, 3, 5, 15]:
+                    p1 = word_pattern.create(seqs, k)
+                    p2 = word_pattern._create_wordpattern_strings(seqs, k)
+                    self.assertEqual(p1.pat_list, p2.pat_list)
+                    self.assertEqual(
+                        [list(d.items()) for d in p1.occr_list],
+                        [list(d.items()) for d in p2.occr_list])
+            finally:
+                word_pattern.COUNT_CHUNK_SIZE = chunk_size
+
+    def test_array_pattern_equals_pattern(self):
+        seqs = self.dna_records.seq_list
+        alphabet = {'A': 'R', 'G': 'R', 'C': 'Y', 'T': 'Y', 'N': 'XY'}
+        for k in [1, 2, 3]:
+            p1 = word_pattern.create(seqs, k)
+            self.assertIsInstance(p1, word_pattern.ArrayPattern)
+            p2 = word_pattern.Pattern(p1.pat_list, p1.occr_list, [])
+            for q1, q2 in [(p1, p2),
+                           (p1.merge_revcomp(), p2.merge_revcomp()),
+                           (p1.reduce_alphabet(alphabet),
+                            p2.reduce_alphabet(alphabet))]:
+                self.assertIsInstance(q1, word_pattern.ArrayPattern)
+                self.assertEqual(q1.pat_list, q2.pat_list)
+                self.assertEqual(q1.occr_list,
+                                 [dict(sorted(d.items()))
+                                  for d in q2.occr_list])
+            self.assertEqual(p1.format(), p2.format())
+
+    def test_array_pattern_from_pattern(self):
+        p1 = word_pattern._create_wordpattern_strings(
+            self.pep_records.seq_list, 2)
+        p2 = word_pattern.ArrayPattern.from_pattern(p1)
+        self.assertEqual(p2.count, p1.count)
+        self.assertEqual(p2.format(), p1.format())
+        self.assertEqual(p2.word_idx.tolist(),
+                         [i for i, d in enumerate(p1.occr_list) for _ in d])
+
+    def test_create_workers_equals_serial(self):
+        seqs = self.pep_records.seq_list + ['', 'A', 'ACDX']
+        for k in [1, 2, 3]:
+            p1 = word_pattern.create(seqs, k)
+            p2 = word_pattern.create(seqs, k, workers=3)
+            self.assertEqual(p2.pat_list, p1.pat_list)
+            self.assertEqual(p2.occr_list, p1.occr_list)
+
+    def test_create_multi_equals_create(self):
+        seqs = self.dna_records.seq_list + ['', 'A', 'ACG']
+        word_sizes = [3, 1, 4, 2]
+        patterns = word_pattern.create_multi(seqs, word_sizes, workers=2)
+        self.assertEqual(len(patterns), len(word_sizes))
+        for k, p2 in zip(word_sizes, patterns):
+            p1 = word_pattern.create(seqs, k)
+            self.assertEqual(p2.pat_list, p1.pat_list)
+            self.assertEqual(p2.occr_list, p1.occr_list)
+
+
+    def test_create_canonical_equals_merge_revcomp(self):
+        # 'N' has no complement; 'Ä' is not encodable as a byte.
+        seqs = self.dna_records.seq_list + ['', 'A', 'ACGTN']
+        for seq_list in [seqs, seqs + ['ACÄT']]:
+            for k in [1, 2, 3]:
+                p1 = word_pattern.create(seq_list, k).merge_revcomp()
+                for workers in [1, 2]:
+                    p2 = word_pattern.create(seq_list, k, workers=workers,
+                                             canonical=True)
+                    self.assertEqual(
+                        sorted(zip(p2.pat_list, p2.occr_list)),
+                        sorted(zip(p1.pat_list, p1.occr_list)))
+
+
+    def test_create_reduced_alphabet_equals_reduce_alphabet(self):
+        seqs = self.dna_records.seq_list + ['', 'A', 'ACGTN']
+        for alphabet_dict in [{'A': 'R', 'G': 'R', 'C': 'Y', 'T': 'Y'},
+                              {'A': 'R', 'G': 'R', 'N': 'XY'}]:
+            for k in [1, 2, 3]:
+                p = word_pattern.create(seqs, k)
+                for canonical in [False, True]:
+                    p1 = p.reduce_alphabet(alphabet_dict)
+                    if canonical:
+                        p1 = p1.merge_revcomp()
+                    p2 = word_pattern.create(seqs, k, workers=2,
+                                             canonical=canonical,
+                                             alphabet_dict=alphabet_dict)
+                    self.assertEqual(
+                        sorted(zip(p2.pat_list, p2.occr_list)),
+                        sorted(zip(p1.pat_list, p1.occr_list)))
+
+
+    def test_write_binary_read(self):
+        seqs = self.dna_records.seq_list
+        for wordpos in [False, True]:
+            p = word_pattern.create(seqs, 2, wordpos)
+            fh = tempfile.NamedTemporaryFile(delete=False)
+            try:
+                word_pattern.write_binary(fh, p)
+                fh.close()
+                with open(fh.name) as handle:
+                    p2 = word_pattern.read(handle)
+                    self.assertIsInstance(p2, word_pattern.ArrayPattern)
+                    self.assertEqual(p2.format(), p.format())
+                    self.assertEqual(p2.pat_list, p.pat_list)
+                    self.assertEqual(bool(p2.pos_list), wordpos)
+                    del p2
+            finally:
+                os.remove(fh.name)
+
+
+    def test_create_positions_equals_strings(self):
+        seqs = self.pep_records.seq_list + ['', 'A', 'ACDX']
+        for k in [1, 2, 3]:
+            p1 = word_pattern._create_wordpattern_positions_strings(seqs, k)
+            p2 = word_pattern.create(seqs, k, wordpos=True)
+            self.assertIsInstance(p2, word_pattern.ArrayPattern)
+            self.assertEqual(p2.pat_list, p1.pat_list)
+            self.assertEqual(p2.occr_list, p1.occr_list)
+            self.assertEqual(p2.pos_list, p1.pos_list)
+
 
 if __name__ == '__main__':
     unittest.main()
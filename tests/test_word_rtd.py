@@ -1,3 +1,4 @@
+import numpy as np
 import unittest
 
 from alfpy import word_pattern
@@ -27,6 +28,19 @@ class Test(unittest.TestCase, utils.ModulesCommonTest):
         exp = (self.pep_records.count, len(self.pep_2mer_pos.pat_list)*2)
         self.assertEqual(vec.shape, exp)
 
+    def test_create_vector_equals_calc_rtd(self):
+        p = word_pattern.Pattern(self.pep_2mer_pos.pat_list,
+                                 self.pep_2mer_pos.occr_list,
+                                 self.pep_2mer_pos.pos_list)
+        exp = np.zeros((self.pep_records.count, p.count * 2))
+        for wordidx in range(p.count):
+            for seqidx, word_positions in p.pos_list[wordidx].items():
+                exp[seqidx, wordidx * 2:wordidx * 2 + 2] = word_rtd.calc_rtd(
+                    word_positions)
+        for pattern in [self.pep_2mer_pos, p]:
+            vec = word_rtd.create_vector(self.pep_records.count, pattern)
+            np.testing.assert_allclose(vec, exp, rtol=1e-12)
+
     def test_distance(self):
         vec = word_rtd.create_vector(self.pep_records.count, self.pep_2mer_pos)
         dist = word_rtd.Distance(vec, 'google')
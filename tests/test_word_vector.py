@@ -1,3 +1,4 @@
+import numpy as np
 import unittest
 
 from alfpy import word_pattern
@@ -91,6 +92,36 @@ class WordVectorTest(unittest.TestCase, utils.ModulesCommonTest):
         ]
         self.assertEqual(freqs.format(), "\n".join(exp))
 
+    def test_weightmodel_weights(self):
+        weights = {'A': 2.0, 'C': 0.5, 'G': 0.0}
+        weightmodel = word_vector.WeightModel(weights)
+        for pattern in [self.pattern2, word_pattern.Pattern(
+                ['AC', 'ACG', 'T', 'CAA'], [{0: 1}] * 4, [])]:
+            exp = []
+            for word in pattern.pat_list:
+                value = 1.0
+                for symbol in word:
+                    value *= weights.get(symbol, 1.0)
+                exp.append(value)
+            w = weightmodel.weights(pattern)
+            self.assertEqual(w.tolist(), exp)
+            self.assertIs(weightmodel.weights(pattern), w)
+        weights['T'] = 3.0
+        self.assertEqual(weightmodel.weights(pattern).tolist(),
+                         [1.0, 0.0, 3.0, 2.0])
+
+    def test_weightmodel_subclass(self):
+        class LengthWeightModel(word_vector.WeightModel):
+            def weights_length(self, words):
+                return np.array([len(word) for word in words], dtype=float)
+
+        weightmodel = LengthWeightModel({}, 'length')
+        counts = word_vector.CountsWeight(self.dna_records.length_list,
+                                          self.pattern2, weightmodel)
+        exp = word_vector.Counts(self.dna_records.length_list,
+                                 self.pattern2).data * 2
+        self.assertEqual(counts.data.tolist(), exp.tolist())
+
     def test_weightmodel_invalid_wtype(self):
         weights = {'A': 2, 'C': 2, 'G': 2, 'T': 2}
         with self.assertRaises(Exception) as context:
@@ -197,6 +228,17 @@ class WordVectorTest(unittest.TestCase, utils.ModulesCommonTest):
         ]
         self.assertEqual(freqs_std.format(), "\n".join(exp))
 
+    def test_var_matrix_equals_var(self):
+        p = word_pattern.create(self.pep_records.seq_list, 3)
+        seq_lengths = self.pep_records.length_list + [1, 3, 4]
+        for freqmodel in [word_vector.EqualFreqs(alphabet_size=20),
+                          word_vector.EquilibriumFreqs({'A': 0.1, 'C': 0.3,
+                                                        'K': 0.05})]:
+            var = freqmodel.var_matrix(p.pat_list, seq_lengths)
+            exp = [[freqmodel.var(word, seq_len) for word in p.pat_list]
+                   for seq_len in seq_lengths]
+            np.testing.assert_allclose(var, exp, rtol=1e-12)
+
     def test_equilibrium_freqs_pattern2(self):
         p = word_pattern.create(self.dna_records.seq_list, 2, True)
         dna_freqs = {'A': 0.24, 'C': 0.26, 'G': 0.23, 'T': 0.27}
@@ -260,12 +302,60 @@ class WordVectorTest(unittest.TestCase, utils.ModulesCommonTest):
             self.pattern3, self.pattern2, self.pattern1)
         self.assertEqual(comp.data.shape, (3, 27))
 
+    def test_composition_values(self):
+        seq_lengths = self.dna_records.length_list
+        comp = word_vector.Composition(seq_lengths, self.pattern3,
+                                       self.pattern2, self.pattern1)
+        counts = [word_vector.Counts(seq_lengths, p)
+                  for p in [self.pattern3, self.pattern2, self.pattern1]]
+        pat_lists = [p.pat_list for p in [self.pattern2, self.pattern1]]
+        for seqnum, seqlen in enumerate(seq_lengths):
+            for patnum, word in enumerate(self.pattern3.pat_list):
+                f = counts[0].data[seqnum, patnum]
+                f_l = counts[1].data[seqnum, pat_lists[0].index(word[:-1])]
+                f_r = counts[1].data[seqnum, pat_lists[0].index(word[1:])]
+                f_lr = counts[2].data[seqnum, pat_lists[1].index(word[1:-1])]
+                f0 = 0.0
+                if f_lr:
+                    f0 = f_l * f_r / f_lr * (
+                        (seqlen - 2.0) * seqlen / (seqlen - 1) ** 2)
+                exp = (f - f0) / f0 if f0 else 0.0
+                self.assertAlmostEqual(comp.data[seqnum, patnum], exp)
+
     def test_composition_dont_follow_rule(self):
         with self.assertRaises(Exception) as context:
             word_vector.Composition(self.dna_records.length_list,
             self.pattern2, self.pattern1, self.pattern3)
         self.assertIn('pattern lengths do not ', str(context.exception))
 
+    def test_sparse_equals_dense(self):
+        weightmodel = word_vector.WeightModel({'A': 2.0, 'C': 0.5})
+        vectors = [(word_vector.Counts, []), (word_vector.Freqs, []),
+                   (word_vector.Bools, []),
+                   (word_vector.CountsWeight, [weightmodel]),
+                   (word_vector.FreqsWeight, [weightmodel])]
+        for pattern in [self.pattern2, self.pattern3]:
+            for cls, args in vectors:
+                dense = cls(self.dna_records.length_list, pattern, *args)
+                sparse = cls(self.dna_records.length_list, pattern, *args,
+                             sparse=True)
+                self.assertEqual(sparse.data.dtype, dense.data.dtype)
+                self.assertEqual(sparse.data.toarray().tolist(),
+                                 dense.data.tolist())
+                self.assertEqual(sparse[1].tolist(), dense[1].tolist())
+                self.assertEqual(sparse.format(), dense.format())
+
+    def test_counts_from_dict_pattern(self):
+        pattern = word_pattern.create(self.dna_records.seq_list, 2, True)
+        counts1 = word_vector.Counts(self.dna_records.length_list,
+                                     self.pattern2)
+        counts2 = word_vector.Counts(self.dna_records.length_list, pattern)
+        self.assertEqual(counts1.data.tolist(), counts2.data.tolist())
+        # Occurrences in sequences beyond seq_lengths are ignored.
+        counts3 = word_vector.Counts(self.dna_records.length_list[:2],
+                                     pattern)
+        self.assertEqual(counts3.data.tolist(), counts1.data[:2].tolist())
+
     def test_read_charval_file(self):
         handle = [
           '# information',